@@ -0,0 +1,102 @@
+import os
+
+import httpx
+from langchain_core.documents import Document
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+API_URL = os.getenv("RAG_API_URL", "").rstrip("/")
+API_TIMEOUT = float(os.getenv("RAG_API_TIMEOUT", "120"))
+
+_client = None
+
+
+# ---------------------------------------
+# 1. Wire format (server.py와 공용)
+# ---------------------------------------
+def doc_to_dict(doc):
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+def doc_from_dict(data):
+    return Document(page_content=data["page_content"], metadata=data.get("metadata") or {})
+
+
+def result_to_dict(result):
+    return {**result, "docs": [doc_to_dict(d) for d in result["docs"]]}
+
+
+# ---------------------------------------
+# 2. Thin client (Streamlit → server.py)
+# ---------------------------------------
+def _get_client():
+    global _client
+    if _client is None:
+        _client = httpx.Client(base_url=API_URL, timeout=API_TIMEOUT)
+    return _client
+
+
+def answer_question(query: str, k: int = 8):
+    """
+    rag_answer.answer_question과 같은 결과 dict를 server.py의 /ask에서 받아옴.
+    """
+    resp = _get_client().post("/ask", json={"question": query, "k": k})
+    resp.raise_for_status()
+
+    result = resp.json()
+    result["docs"] = [doc_from_dict(d) for d in result["docs"]]
+    return result
+
+
+def retrieve(query: str, k: int = 6, target_type: str = None):
+    resp = _get_client().post("/retrieve", json={"query": query, "k": k, "target_type": target_type})
+    resp.raise_for_status()
+    return [doc_from_dict(d) for d in resp.json()["docs"]]
+
+
+# ---------------------------------------
+# 3. 빌드 작업 / 상태 (단일 writer인 server.py 경유)
+# ---------------------------------------
+def rebuild(pdf_path: str = None):
+    """
+    /rebuild에 빌드 job 등록 → job id.
+    pdf_path는 서버 기준 경로 (data 폴더를 서버와 공유해야 함).
+    """
+    resp = _get_client().post("/rebuild", json={"pdf_path": pdf_path})
+    resp.raise_for_status()
+    return resp.json()["job_id"]
+
+
+# processors.jobs와 같은 이름 → Streamlit은 API 모드에서 모듈만 바꿔 사용
+submit_job = rebuild
+
+
+def list_jobs(limit: int = 20):
+    resp = _get_client().get("/jobs", params={"limit": limit})
+    resp.raise_for_status()
+    return resp.json()["jobs"]
+
+
+def has_active_jobs():
+    return any(j["status"] in ("queued", "running") for j in list_jobs(limit=20))
+
+
+def cancel_job(job_id: int):
+    resp = _get_client().post(f"/jobs/{job_id}/cancel")
+    resp.raise_for_status()
+
+
+def healthz():
+    resp = _get_client().get("/healthz")
+    resp.raise_for_status()
+    return resp.json()
+
+
+def metrics(format: str = "json"):
+    """
+    서버의 누적 지표. format="json" → tracing.snapshot() dict, "prometheus" → text.
+    """
+    resp = _get_client().get("/metrics", params={"format": format})
+    resp.raise_for_status()
+    return resp.json() if format == "json" else resp.text
@@ -0,0 +1,159 @@
+"""
+규정 질문 세트를 한 번에 돌리는 batch QA.
+
+    python batch_ask.py questions.jsonl -o results.jsonl --concurrency 8
+
+입력: 한 줄에 질문 1개인 txt, 또는 {"id": ..., "question": ...} JSONL
+출력: 질문별 {"id", "question", "query_en", "answer", "grounded", "citations", "sources"} JSONL
+"""
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from processors.glossary import expand_query
+from rag_answer import (
+    answer_from_docs,
+    dedupe_docs,
+    english_prompt,
+    get_translator,
+)
+from retriever import retrieve_many
+from tracing import span, export_json
+
+
+# ---------------------------------------
+# 1. 번역 (중복 제거 + batch)
+# ---------------------------------------
+def translate_many(queries, concurrency: int = 8):
+    """
+    같은 질문은 한 번만 번역.
+    영어 질문 / 용어집으로 대부분 덮이는 질문은 로컬 확장, 나머지만 runnable.batch로 동시에 요청.
+    반환: {원문: 영문}
+    """
+    translated = {}
+    for q in dict.fromkeys(queries):
+        expanded = expand_query(q)
+        if expanded:
+            translated[q] = expanded
+
+    unique = [q for q in dict.fromkeys(queries) if q not in translated]
+    if not unique:
+        return translated
+
+    with span("translate_en_batch"):
+        responses = get_translator().batch(
+            [english_prompt(q) for q in unique],
+            config={"max_concurrency": concurrency},
+            return_exceptions=True,
+        )
+
+    for q, resp in zip(unique, responses):
+        # 번역 실패 시 원문으로 검색
+        translated[q] = q if isinstance(resp, Exception) else resp.content.strip()
+    return translated
+
+
+# ---------------------------------------
+# 2. Batch QA
+# ---------------------------------------
+def ask_many(queries, k: int = 8, concurrency: int = 4):
+    """
+    질문 리스트 → 결과 dict 리스트 (입력 순서 유지).
+
+    - 번역: 중복 제거 후 batch
+    - 검색: 한국어 + 영어 질문 전체를 embedding 1회 + store별 query 1회로 처리
+    - 답변 생성: concurrency 개수만큼만 동시에 LLM 호출
+    """
+    queries = [q.strip() for q in queries]
+
+    query_en = translate_many(queries, concurrency=concurrency)
+
+    search_texts = list(dict.fromkeys(queries + list(query_en.values())))
+    searched = dict(zip(search_texts, retrieve_many(search_texts, k=k)))
+
+    def run_one(query):
+        q_en = query_en.get(query, query)
+        docs = dedupe_docs(searched.get(query, []) + searched.get(q_en, []))
+        try:
+            return answer_from_docs(query, q_en, docs)
+        except Exception as e:
+            return {"query_en": q_en, "error": repr(e)}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(run_one, queries))
+
+
+# ---------------------------------------
+# 3. JSONL 입출력
+# ---------------------------------------
+def load_questions(path):
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for idx, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                row = json.loads(line)
+                items.append({"id": row.get("id", idx), "question": row["question"]})
+            else:
+                items.append({"id": idx, "question": line})
+    return items
+
+
+def to_record(item, result):
+    record = {
+        "id": item["id"],
+        "question": item["question"],
+        "query_en": result.get("query_en"),
+    }
+    if "error" in result:
+        record["error"] = result["error"]
+        return record
+
+    record.update({
+        "answer": result["answer"],
+        "grounded": result["grounded"],
+        "citations": result["citations"],
+        "sources": [
+            {k: d.metadata.get(k) for k in ("article", "section", "page", "table_index", "source_store")}
+            for d in result["docs"]
+        ],
+    })
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch regulation QA")
+    parser.add_argument("questions", help="txt (한 줄 1질문) 또는 JSONL ({id, question})")
+    parser.add_argument("-o", "--output", default="output/batch_results.jsonl")
+    parser.add_argument("-k", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4, help="동시 답변 생성 수")
+    parser.add_argument("--metrics", help="stage latency JSON 저장 경로")
+    args = parser.parse_args()
+
+    items = load_questions(args.questions)
+    print(f"Questions loaded: {len(items)}")
+
+    results = ask_many([it["question"] for it in items], k=args.k, concurrency=args.concurrency)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        for item, result in zip(items, results):
+            f.write(json.dumps(to_record(item, result), ensure_ascii=False) + "\n")
+
+    errors = sum(1 for r in results if "error" in r)
+    print(f"✓ {len(results)} results → {args.output} (errors: {errors})")
+
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(export_json())
+
+
+if __name__ == "__main__":
+    main()
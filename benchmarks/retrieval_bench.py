@@ -0,0 +1,248 @@
+"""
+Retrieval 품질 vs latency 벤치마크.
+
+고정 corpus로 검색 설정(k, chunk 크기, store 구성, centroid router)별
+recall@k / MRR / query latency / throughput을 측정하고 비교 리포트를 만듦.
+
+store는 ingestion과 같은 helper(save_vectorstore + build_profile, live store 이름)로 만들고,
+검색은 서비스와 같은 retriever._retrieve_across_all (shard 선택 → centroid router → store별 검색)
+경로로 실행 → k / router / store 구성 변경이 실제 서비스에서 주는 효과를 그대로 측정.
+
+    python -m benchmarks.retrieval_bench
+    python -m benchmarks.retrieval_bench --k 3 5 8 --chunk-sizes 600 1000 --layouts per_type merged --router on off
+    RAG_PROVIDER=openai python -m benchmarks.retrieval_bench --corpus data --golden my_golden.jsonl
+
+RAG_PROVIDER를 지정하지 않으면 결정적 local hash embedding 사용.
+golden set (JSONL): {"id": ..., "question": ..., "expected_sections": ["B1.7.3", ...]}
+"""
+import os
+
+# 서비스 모듈(clients / retriever)은 import 시점에 provider를 읽음 → 그 전에 기본값 설정
+os.environ.setdefault("RAG_PROVIDER", "local")
+
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+import retriever
+from clients import get_embeddings
+from processors.build_vectorstores import detect_doc_type
+from processors.grammars import detect_grammar, parse_with_grammar
+from processors.shards import shard_name
+from processors.store_profile import build_profile, load_profile
+from processors.text_processor import chunk_optimize, fallback_chunking, load_pdf, save_vectorstore
+from rag_answer import dedupe_docs
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "corpus")
+DEFAULT_GOLDEN = os.path.join(BENCH_DIR, "golden_questions.jsonl")
+
+
+# -----------------------------------------------------------
+# 1. Corpus / Golden set 로드
+# -----------------------------------------------------------
+def load_corpus(corpus_dir):
+    """
+    .pdf → PyPDFLoader pages, .txt → 파일 1개 = page 1개.
+    반환: {파일명: pages}
+    """
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if name.lower().endswith(".pdf"):
+            corpus[name] = load_pdf(path)
+        elif name.lower().endswith(".txt"):
+            with open(path, "r", encoding="utf-8") as f:
+                corpus[name] = [Document(page_content=f.read(), metadata={"source": name})]
+    return corpus
+
+
+def load_golden(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# -----------------------------------------------------------
+# 2. 설정별 index 구성
+# -----------------------------------------------------------
+def chunk_corpus(corpus, max_chars, overlap):
+    """
+    ingestion과 같은 grammar 파싱 + chunk_optimize(max_chars, overlap).
+    grammar가 안 맞는 문서는 fallback chunking (chunk 크기 고정).
+    반환: {doc_type: chunks}
+    """
+    by_type = {}
+    for name, pages in corpus.items():
+        doc_type = detect_doc_type(name)
+        grammar = detect_grammar(pages, doc_type)
+        if grammar:
+            chunks = chunk_optimize(parse_with_grammar(pages, grammar), max_chars=max_chars, overlap=overlap)
+        else:
+            chunks = fallback_chunking(pages)
+        by_type.setdefault(doc_type, []).extend(chunks)
+    return by_type
+
+
+def build_stores(by_type, layout, workdir):
+    """
+    live store 이름 / ingestion helper로 text store 구성.
+
+    layout
+    - per_type : doc_type별 store (sporting_text, technical_text … 현재 ingestion 구조)
+    - merged   : 모든 문서를 store 1개에 (merged_text)
+
+    반환: retriever.VECTORSTORES와 같은 형태 {name: {"name", "path", "vs", "profile"}}
+    """
+    if layout == "merged":
+        groups = {"merged": [c for chunks in by_type.values() for c in chunks]}
+    else:
+        groups = by_type
+
+    stores = {}
+    for doc_type, chunks in groups.items():
+        name = f"{shard_name(doc_type, None, None)}_text"
+        path = os.path.join(workdir, name)
+        save_vectorstore(chunks, path)
+        build_profile(path)
+        stores[name] = {
+            "name": name,
+            "path": path,
+            "vs": Chroma(persist_directory=path, embedding_function=get_embeddings()),
+            "profile": load_profile(path),
+        }
+    return stores
+
+
+# -----------------------------------------------------------
+# 3. 검색 + 지표
+# -----------------------------------------------------------
+def search(query, k):
+    # 서비스와 같은 경로: 검색 결과 → near-duplicate 제거 (answer_question의 dedupe_docs)
+    return dedupe_docs(retriever._retrieve_across_all(query, k))
+
+
+def score_query(docs, expected, k):
+    sections = [d.metadata.get("section") for d in docs]
+    hits = {s for s in sections[:k] if s in expected}
+
+    rr = 0.0
+    for rank, s in enumerate(sections, start=1):
+        if s in expected:
+            rr = 1.0 / rank
+            break
+
+    return len(hits) / len(expected), rr
+
+
+def _pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * (len(values) - 1)))] if values else 0.0
+
+
+def run_config(corpus, golden, k, max_chars, overlap, layout, router, workdir):
+    by_type = chunk_corpus(corpus, max_chars, overlap)
+    stores = build_stores(by_type, layout, workdir)
+
+    # router off → profile 없는 store 취급 (항상 전체 store, article 필터 없음)
+    if router == "off":
+        stores = {name: {**item, "profile": None} for name, item in stores.items()}
+    retriever.use_vectorstores(stores)
+
+    # warm-up (첫 query의 index load 비용 제외)
+    search(golden[0]["question"], k)
+
+    recalls, rrs, latencies, returned = [], [], [], []
+    started = time.perf_counter()
+    for item in golden:
+        t0 = time.perf_counter()
+        docs = search(item["question"], k)
+        latencies.append(time.perf_counter() - t0)
+
+        recall, rr = score_query(docs, set(item["expected_sections"]), len(docs))
+        recalls.append(recall)
+        rrs.append(rr)
+        returned.append(len(docs))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "k": k,
+        "max_chars": max_chars,
+        "overlap": overlap,
+        "layout": layout,
+        "router": router,
+        "stores": len(stores),
+        "chunks": sum(len(c) for c in by_type.values()),
+        "docs": round(sum(returned) / len(returned), 1),  # answer 단계로 넘어가는 평균 문서 수
+        "recall@k": round(sum(recalls) / len(recalls), 4),
+        "mrr": round(sum(rrs) / len(rrs), 4),
+        "p50_ms": round(_pct(latencies, 0.5) * 1000, 2),
+        "p95_ms": round(_pct(latencies, 0.95) * 1000, 2),
+        "qps": round(len(golden) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+# -----------------------------------------------------------
+# 4. 리포트
+# -----------------------------------------------------------
+COLUMNS = [
+    "layout", "router", "max_chars", "overlap", "k", "stores", "chunks", "docs",
+    "recall@k", "mrr", "p50_ms", "p95_ms", "qps",
+]
+
+
+def to_markdown(rows, baseline=None):
+    lines = [
+        "| " + " | ".join(COLUMNS) + " | Δrecall | Δp50_ms |",
+        "|" + "---|" * (len(COLUMNS) + 2),
+    ]
+    for r in rows:
+        d_recall = d_p50 = ""
+        if baseline:
+            d_recall = f"{r['recall@k'] - baseline['recall@k']:+.3f}"
+            d_p50 = f"{r['p50_ms'] - baseline['p50_ms']:+.2f}"
+        lines.append("| " + " | ".join(str(r[c]) for c in COLUMNS) + f" | {d_recall} | {d_p50} |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval quality vs latency benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help=".txt / .pdf 디렉토리")
+    parser.add_argument("--golden", default=DEFAULT_GOLDEN)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 6])
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--overlap", type=int, default=200)
+    parser.add_argument("--layouts", nargs="+", default=["per_type", "merged"], choices=["per_type", "merged"])
+    parser.add_argument("--router", nargs="+", default=["on"], choices=["on", "off"], help="centroid router 사용 여부")
+    parser.add_argument("-o", "--output", default="output/retrieval_bench.json")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    golden = load_golden(args.golden)
+    print(f"Corpus files: {len(corpus)} · Golden questions: {len(golden)}")
+
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    rows = []
+    try:
+        for layout, router, max_chars, k in itertools.product(args.layouts, args.router, args.chunk_sizes, args.k):
+            cfg_dir = os.path.join(workdir, f"{layout}-{router}-{max_chars}-{k}")
+            rows.append(run_config(corpus, golden, k, max_chars, args.overlap, layout, router, cfg_dir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # 첫 설정을 기준으로 차이 표시
+    print(to_markdown(rows, baseline=rows[0] if rows else None))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"corpus": args.corpus, "golden": args.golden, "results": rows}, f, ensure_ascii=False, indent=2)
+    print(f"✓ Report saved → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
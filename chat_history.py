@@ -0,0 +1,139 @@
+"""
+Session별 대화 기록 (구조화된 record + 크기 제한 + page 단위 조회).
+
+- 메모리에는 최근 MAX_IN_MEMORY개 record만 유지
+- 그보다 오래된 record는 SQLite(output/chat_history.sqlite3)로 spill
+- UI는 page(page_idx, page_size)로 필요한 부분만 읽어서 렌더링
+  → 대화가 길어져도 rerun 1번의 비용은 page 크기만큼으로 일정
+
+record = {"seq", "role": "user" | "assistant", "content", "citations", "grounded", "degraded", "query_en"}
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+from contextlib import closing
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+HISTORY_DB = os.getenv("RAG_CHAT_HISTORY_DB", "output/chat_history.sqlite3")
+MAX_IN_MEMORY = int(os.getenv("RAG_CHAT_MAX_IN_MEMORY", "20"))
+RETENTION_DAYS = float(os.getenv("RAG_CHAT_RETENTION_DAYS", "7"))
+CITATION_MAX_CHARS = 600  # 표 인용은 길 수 있으므로 저장 시 자름
+
+_purged = threading.Event()
+
+
+def _connect():
+    os.makedirs(os.path.dirname(HISTORY_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(HISTORY_DB, timeout=30, isolation_level=None)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            record TEXT NOT NULL,
+            created_at REAL,
+            PRIMARY KEY (session_id, seq)
+        )
+    """)
+
+    # 오래된 session 기록은 프로세스당 1번 정리
+    if not _purged.is_set():
+        _purged.set()
+        conn.execute(
+            "DELETE FROM chat_messages WHERE created_at < ?",
+            (time.time() - RETENTION_DAYS * 86400,),
+        )
+    return conn
+
+
+def answer_record(result):
+    """
+    answer_question 결과 dict → assistant record (HTML / Document는 저장하지 않음).
+    """
+    return {
+        "role": "assistant",
+        "content": result["answer"],
+        "citations": [
+            {"text": c["text"][:CITATION_MAX_CHARS], "citation": c["citation"]}
+            for c in result.get("citations", [])
+        ],
+        "grounded": result.get("grounded", True),
+        "degraded": result.get("degraded", []),
+        "query_en": result.get("query_en"),
+    }
+
+
+# ---------------------------------------
+# 1. ChatHistory
+# ---------------------------------------
+class ChatHistory:
+
+    def __init__(self, session_id: str, max_in_memory: int = MAX_IN_MEMORY):
+        self.session_id = session_id
+        self.max_in_memory = max_in_memory
+        self._recent = deque()
+        self._spilled = 0  # SQLite로 옮긴 record 수 (= 메모리에 있는 첫 record의 seq)
+
+    def __len__(self):
+        return self._spilled + len(self._recent)
+
+    def append(self, record):
+        record = {**record, "seq": len(self)}
+        self._recent.append(record)
+
+        # 메모리 상한 초과분은 SQLite로
+        if len(self._recent) > self.max_in_memory:
+            overflow = [self._recent.popleft() for _ in range(len(self._recent) - self.max_in_memory)]
+            with closing(_connect()) as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chat_messages (session_id, seq, record, created_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (self.session_id, r["seq"], json.dumps(r, ensure_ascii=False), time.time())
+                        for r in overflow
+                    ],
+                )
+            self._spilled += len(overflow)
+
+        return record
+
+    def add_user(self, text: str):
+        return self.append({"role": "user", "content": text})
+
+    def add_answer(self, result):
+        return self.append(answer_record(result))
+
+    def page_count(self, page_size: int):
+        return max(1, -(-len(self) // page_size))
+
+    def page(self, page_idx: int = 0, page_size: int = 10):
+        """
+        최신순 page_idx번째 page의 record 리스트 (최신 record가 앞).
+        """
+        newest = len(self) - 1 - page_idx * page_size
+        oldest = max(0, newest - page_size + 1)
+        if newest < 0:
+            return []
+
+        records = [r for r in self._recent if oldest <= r["seq"] <= newest]
+
+        # 메모리에 없는 범위만 SQLite에서 조회
+        if oldest < self._spilled:
+            with closing(_connect()) as conn:
+                rows = conn.execute(
+                    "SELECT record FROM chat_messages WHERE session_id = ? AND seq BETWEEN ? AND ?",
+                    (self.session_id, oldest, min(newest, self._spilled - 1)),
+                ).fetchall()
+            records.extend(json.loads(r[0]) for r in rows)
+
+        return sorted(records, key=lambda r: -r["seq"])
+
+    def clear(self):
+        self._recent.clear()
+        if self._spilled:
+            with closing(_connect()) as conn:
+                conn.execute("DELETE FROM chat_messages WHERE session_id = ?", (self.session_id,))
+        self._spilled = 0
@@ -0,0 +1,163 @@
+import os
+import threading
+
+import httpx
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from providers import PROVIDER, LocalChatModel, LocalHashEmbeddings
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+REQUEST_TIMEOUT = float(os.getenv("RAG_LLM_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("RAG_LLM_MAX_RETRIES", "2"))
+POOL_MAX_CONNECTIONS = int(os.getenv("RAG_HTTP_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.getenv("RAG_HTTP_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("RAG_HTTP_KEEPALIVE_EXPIRY", "30"))
+
+EMBEDDING_MODEL = "text-embedding-3-large"
+
+_lock = threading.Lock()
+_http_client = None
+_chat_models = {}
+_embeddings = {}
+
+_stats = {
+    "requests": 0,
+    "in_flight": 0,
+    "errors": 0,
+}
+
+
+# ---------------------------------------
+# 1. 공유 HTTP client (keep-alive connection pool)
+# ---------------------------------------
+class _CountingTransport(httpx.HTTPTransport):
+    """
+    요청 수 / 진행 중 요청 / 에러 수를 집계하는 transport.
+    """
+
+    def handle_request(self, request):
+        with _lock:
+            _stats["requests"] += 1
+            _stats["in_flight"] += 1
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            with _lock:
+                _stats["errors"] += 1
+            raise
+        finally:
+            with _lock:
+                _stats["in_flight"] -= 1
+
+        if response.status_code >= 400:
+            with _lock:
+                _stats["errors"] += 1
+        return response
+
+
+def get_http_client():
+    """
+    모든 LLM / Embedding client가 공유하는 httpx.Client.
+    thread-safe 하므로 Streamlit session / thread pool 간에 TLS 연결을 재사용.
+    """
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            limits = httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            )
+            _http_client = httpx.Client(
+                transport=_CountingTransport(limits=limits),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+            )
+        return _http_client
+
+
+# ---------------------------------------
+# 2. Client Registry
+# ---------------------------------------
+def get_chat_model(model: str = "gpt-4o", temperature: float = 0, timeout: float = None):
+    """
+    (model, temperature, timeout) 조합마다 ChatOpenAI 1개만 생성해서 재사용.
+    RAG_PROVIDER=local 이면 LocalChatModel stub 반환.
+
+    - timeout : 호출 1회 deadline (초)
+    - max_retries : 429 / 5xx / 연결 오류 재시도 횟수
+      (openai SDK가 exponential backoff + jitter로 재시도)
+    """
+    timeout = timeout or REQUEST_TIMEOUT
+    key = (model, temperature, timeout)
+
+    llm = _chat_models.get(key)
+    if llm is None:
+        http_client = get_http_client() if PROVIDER != "local" else None
+        with _lock:
+            llm = _chat_models.get(key)
+            if llm is None:
+                if PROVIDER == "local":
+                    llm = LocalChatModel(model=model)
+                else:
+                    llm = ChatOpenAI(
+                        model=model,
+                        temperature=temperature,
+                        timeout=timeout,
+                        max_retries=MAX_RETRIES,
+                        http_client=http_client,
+                    )
+                _chat_models[key] = llm
+    return llm
+
+
+def get_embeddings(model: str = EMBEDDING_MODEL):
+    """
+    검색 / ingestion 공용 OpenAIEmbeddings (모델당 1개).
+    RAG_PROVIDER=local 이면 LocalHashEmbeddings stub 반환.
+    """
+    emb = _embeddings.get(model)
+    if emb is None:
+        http_client = get_http_client() if PROVIDER != "local" else None
+        with _lock:
+            emb = _embeddings.get(model)
+            if emb is None:
+                if PROVIDER == "local":
+                    emb = LocalHashEmbeddings()
+                else:
+                    emb = OpenAIEmbeddings(
+                        model=model,
+                        timeout=REQUEST_TIMEOUT,
+                        max_retries=MAX_RETRIES,
+                        http_client=http_client,
+                    )
+                _embeddings[model] = emb
+    return emb
+
+
+# ---------------------------------------
+# 3. Connection pool 통계
+# ---------------------------------------
+def pool_stats():
+    """
+    {"requests", "in_flight", "errors", "open_connections", "idle_connections", ...}
+    """
+    with _lock:
+        stats = dict(_stats)
+        client = _http_client
+        stats["chat_models"] = len(_chat_models)
+        stats["embedding_models"] = len(_embeddings)
+
+    stats["open_connections"] = 0
+    stats["idle_connections"] = 0
+
+    if client is not None:
+        # httpcore ConnectionPool 내부 상태 (버전에 따라 없을 수 있음)
+        pool = getattr(client._transport, "_pool", None)
+        for conn in getattr(pool, "connections", []):
+            stats["open_connections"] += 1
+            if conn.is_idle():
+                stats["idle_connections"] += 1
+
+    return stats
@@ -0,0 +1,153 @@
+import os
+import re
+import json
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "2500"))
+TABLE_MAX_ROWS = int(os.getenv("RAG_TABLE_MAX_ROWS", "12"))
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.7"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_encoder = None
+
+
+# ---------------------------------------
+# 1. 토큰 수 추정
+# ---------------------------------------
+def estimate_tokens(text: str) -> int:
+    """
+    gpt-4o tokenizer(o200k_base)로 토큰 수 계산.
+    tiktoken 인코딩을 못 불러오면 (오프라인 등) 4글자 ≈ 1토큰 근사치 사용.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = False
+
+    if _encoder:
+        return len(_encoder.encode(text))
+    return len(text) // 4 + 1
+
+
+def _terms(text: str):
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 1}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# ---------------------------------------
+# 2. 표 → 관련 행만 남기기
+# ---------------------------------------
+def trim_table_rows(table_data, q_terms, max_rows: int = TABLE_MAX_ROWS):
+    """
+    Camelot 표(JSON records)에서 질문 단어와 겹치는 행만 남김.
+
+    - 첫 행은 대부분 header 이므로 항상 유지
+    - 나머지는 겹치는 단어 수 기준 상위 max_rows-1 개 (원래 순서 유지)
+    - 겹치는 행이 하나도 없으면 앞쪽 행들을 그대로 사용
+    """
+    if not isinstance(table_data, list) or len(table_data) <= max_rows:
+        return table_data
+
+    header, rows = table_data[0], table_data[1:]
+
+    scored = []
+    for idx, row in enumerate(rows):
+        row_terms = _terms(" ".join(str(v) for v in row.values())) if isinstance(row, dict) else set()
+        scored.append((len(row_terms & q_terms), idx))
+
+    if not any(score for score, _ in scored):
+        return table_data[:max_rows]
+
+    keep = sorted(scored, key=lambda x: (-x[0], x[1]))[: max_rows - 1]
+    keep_idx = sorted(idx for _, idx in keep)
+
+    return [header] + [rows[i] for i in keep_idx]
+
+
+# ---------------------------------------
+# 3. 후보 → Context block 변환
+# ---------------------------------------
+def _make_candidate(doc, rank, q_terms):
+    if doc.metadata.get("type") == "table":
+        try:
+            table_data = json.loads(doc.page_content)
+        except (ValueError, TypeError):
+            return None
+
+        table_data = trim_table_rows(table_data, q_terms)
+        text = json.dumps(table_data, ensure_ascii=False)
+        block = "TABLE_DATA:\n" + text
+    else:
+        table_data = None
+        text = doc.page_content
+        block = text
+
+    terms = _terms(text)
+    overlap = len(terms & q_terms) / len(q_terms) if q_terms else 0.0
+
+    return {
+        "doc": doc,
+        "block": block,
+        "table": table_data,
+        "terms": terms,
+        "tokens": estimate_tokens(block),
+        # 질문 단어 overlap + 검색 순위 prior
+        "relevance": overlap + 0.1 / (1 + rank),
+    }
+
+
+# ---------------------------------------
+# 4. MMR + Token budget packing
+# ---------------------------------------
+def pack_context(docs, query: str, budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+                 lambda_: float = MMR_LAMBDA):
+    """
+    검색 결과를 token budget 안에서 Context로 조립.
+
+    - MMR: lambda * relevance - (1 - lambda) * (이미 뽑힌 chunk와의 최대 유사도)
+      → overlap chunk / 같은 조항 중복이 Context를 채우지 않도록 함
+    - 남은 budget보다 큰 후보는 건너뛰고 더 작은 후보로 계속 채움
+    - 표는 질문과 관련된 행만 남긴 compact JSON으로 넣음
+
+    반환: [{"doc", "block", "table", "tokens", ...}, ...] (선택 순서 = 중요도 순)
+    """
+    q_terms = _terms(query)
+
+    candidates = []
+    for rank, d in enumerate(docs):
+        cand = _make_candidate(d, rank, q_terms)
+        if cand is not None:
+            candidates.append(cand)
+
+    selected = []
+    remaining = budget_tokens
+
+    while candidates:
+        best, best_score = None, None
+        for cand in candidates:
+            if cand["tokens"] > remaining:
+                continue
+            redundancy = max((_jaccard(cand["terms"], s["terms"]) for s in selected), default=0.0)
+            score = lambda_ * cand["relevance"] - (1 - lambda_) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = cand, score
+
+        if best is None:
+            break
+
+        selected.append(best)
+        candidates.remove(best)
+        remaining -= best["tokens"]
+
+    return selected
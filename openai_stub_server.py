@@ -0,0 +1,126 @@
+"""
+OpenAI wire format을 흉내내는 로컬 HTTP stub 서버.
+
+실제 OpenAI SDK / ChatOpenAI / OpenAIEmbeddings 코드 경로(HTTP, connection pool,
+retry 포함)를 그대로 타면서 API 비용과 latency 잡음 없이 부하 테스트할 때 사용.
+
+    python openai_stub_server.py --port 8808 --latency-ms 300
+
+    export OPENAI_BASE_URL=http://127.0.0.1:8808/v1
+    export OPENAI_API_KEY=stub
+"""
+import time
+import json
+import base64
+import struct
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from providers import local_embed, local_complete, estimate_usage, LOCAL_EMBEDDING_DIM
+
+
+def _input_to_text(item):
+    # OpenAIEmbeddings는 tiktoken token id 리스트로 보내는 경우가 있음
+    if isinstance(item, list):
+        return " ".join(str(t) for t in item)
+    return str(item)
+
+
+def _encode_vector(vec, encoding_format):
+    if encoding_format == "base64":
+        return base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii")
+    return vec
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        req = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if self.path.endswith("/chat/completions"):
+            self._send_json(200, self._chat(req))
+        elif self.path.endswith("/embeddings"):
+            self._send_json(200, self._embeddings(req))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def _chat(self, req):
+        prompt = "\n".join(str(m.get("content", "")) for m in req.get("messages", []))
+        text = local_complete(prompt)
+        usage = estimate_usage(prompt, text)
+
+        return {
+            "id": f"chatcmpl-stub-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": usage["input_tokens"],
+                "completion_tokens": usage["output_tokens"],
+                "total_tokens": usage["total_tokens"],
+            },
+        }
+
+    def _embeddings(self, req):
+        inputs = req.get("input", [])
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+
+        dim = req.get("dimensions") or LOCAL_EMBEDDING_DIM
+        fmt = req.get("encoding_format", "float")
+
+        data = [
+            {
+                "object": "embedding",
+                "index": i,
+                "embedding": _encode_vector(local_embed(_input_to_text(item), dim), fmt),
+            }
+            for i, item in enumerate(inputs)
+        ]
+        tokens = sum(len(_input_to_text(item)) // 4 + 1 for item in inputs)
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": req.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible local stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="응답마다 주입할 지연 (ms)")
+    args = parser.parse_args()
+
+    StubHandler.latency_ms = args.latency_ms
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"OpenAI stub listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
 import os
+import hashlib
 from processors.text_processor import (
     load_pdf,
-    split_by_article,
-    split_into_sections,
     chunk_optimize,
     save_vectorstore, fallback_chunking
 )
+from processors.grammars import detect_grammar, parse_with_grammar
 
 from processors.table_processor import (
     extract_tables,
     save_table_vectorstore, convert_tables_to_documents
 )
 
+from processors.glossary import update_store_terms
+from processors.shards import detect_shard, managed_stores, update_manifest
+from processors.store_profile import build_profile
+from processors.store_swap import (
+    live_path,
+    new_staging_dir,
+    validate_store,
+    promote,
+    retire,
+    discard,
+)
+
 
 # -----------------------------
 # 문서 타입 자동 감지
@@ -25,74 +37,234 @@ def detect_doc_type(filename: str):
     if "technical" in name or "Technical" in name or "section_c" in name:
         return "technical"
 
-    if "operational" in name or "Operational" in name:
+    if "operational" in name or "Operational" in name or "section_f" in name:
         return "operational"
 
+    if "financial" in name or "section_d" in name or "section_e" in name:
+        return "financial"
+
     return "misc"  # fallback
 
 
 # -----------------------------
-# PDF → text vectorstore
+# 진행률 보고
 # -----------------------------
-def build_text_store(pdf_path, out_dir):
-    pages = load_pdf(pdf_path)
+# (stage, 전체 대비 비중) — doc_type 1개 빌드 기준
+BUILD_STAGES = [
+    ("load_pdf", 0.05),
+    ("parse_text", 0.05),
+    ("embed_text", 0.45),
+    ("extract_tables", 0.30),
+    ("embed_tables", 0.15),
+]
+
+
+def _report(progress, stage, fraction=0.0):
+    if progress:
+        progress(stage, fraction)
 
-    # 1) Sporting 규정 전용 파싱 시도
-    article_chunks = split_by_article(pages)
 
-    if len(article_chunks) == 0:
+def _stage_reporter(progress, stage):
+    return (lambda f: progress(stage, f)) if progress else None
+
+
+# -----------------------------
+# 출처 metadata (index 점검 / compaction용)
+# -----------------------------
+def file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def stamp_source(docs, pdf_path, store_name, chunker):
+    """
+    chunk마다 원본 PDF / 버전(sha1) / store / chunking 방식 기록.
+    → 삭제된 PDF(orphan), 예전 버전(stale) chunk를 찾아낼 수 있음
+    """
+    source = os.path.basename(pdf_path)
+    sha1 = file_sha1(pdf_path)
+    for d in docs:
+        d.metadata.update({
+            "source": source,
+            "source_sha1": sha1,
+            "source_store": store_name,
+            "chunker": chunker,
+        })
+    return docs
+
+
+# -----------------------------
+# PDF → text chunks
+# -----------------------------
+def parse_text_chunks(pages, doc_type=None):
+    """
+    반환: (chunks, chunker 이름)
+    chunker = "grammar:<family>" 또는 "fallback"
+    """
+    # 1) 문서 family grammar로 article / section 파싱 (doc_type 우선, 없으면 자동 감지)
+    grammar = detect_grammar(pages, doc_type)
+
+    if grammar is None:
         print("⚠ ARTICLE 패턴이 없어 fallback chunking 사용")
-        chunks = fallback_chunking(pages)
-    else:
-        # Sporting 구조 정상 처리
-        sections = []
-        for title, body in article_chunks:
-            sections.extend(split_into_sections(title, body))
+        return fallback_chunking(pages), "fallback"
+
+    # 2) 조항 단위 section → 최적화 chunk
+    sections = parse_with_grammar(pages, grammar)
+    return chunk_optimize(sections), f"grammar:{grammar['name']}"
 
-        chunks = chunk_optimize(sections)
 
-    save_vectorstore(chunks, out_dir)
+# -----------------------------
+# staging 빌드 → 검증 → promote
+# -----------------------------
+def _build_and_promote(name, docs, save_fn, progress_fn):
+    """
+    live store에 추가하지 않고 항상 새 staging 디렉토리에 처음부터 빌드.
+    검증 통과 시에만 live로 교체, 실패하면 staging 삭제 (live는 그대로).
+    """
+    staging = new_staging_dir(name)
+    try:
+        store = save_fn(docs, staging, progress_fn)
+        if store is None:
+            discard(staging)
+            retire(name)
+            update_store_terms(name, [])
+            return
 
+        stats = validate_store(staging, len(docs))
+        print(f"✓ Validated {name}: {stats}")
+
+        # 검색 router용 centroid profile (build 디렉토리에 함께 저장)
+        build_profile(staging)
+    except BaseException:
+        discard(staging)
+        raise
+
+    promote(name, staging)
+    update_store_terms(name, docs)
 
 
 # -----------------------------
-# PDF → table vectorstore
+# PDF들 → text vectorstore
 # -----------------------------
+def build_text_store(pdf_paths, name, progress=None):
+    chunks = []
+    for i, pdf_path in enumerate(pdf_paths):
+        _report(progress, "load_pdf", i / len(pdf_paths))
+        pages = load_pdf(pdf_path)
+
+        _report(progress, "parse_text", i / len(pdf_paths))
+        file_chunks, chunker = parse_text_chunks(pages, detect_doc_type(pdf_path))
+        chunks.extend(stamp_source(file_chunks, pdf_path, name, chunker))
 
-def build_table_store(pdf_path, out_dir):
-    tables = extract_tables(pdf_path)
+    _report(progress, "embed_text")
+    _build_and_promote(name, chunks, save_vectorstore, _stage_reporter(progress, "embed_text"))
 
-    # ✔ Table → Document 변환
-    docs = convert_tables_to_documents(tables)
+
+# -----------------------------
+# PDF들 → table vectorstore
+# -----------------------------
+
+def build_table_store(pdf_paths, name, progress=None):
+    docs = []
+    for i, pdf_path in enumerate(pdf_paths):
+        _report(progress, "extract_tables", i / len(pdf_paths))
+        tables = extract_tables(pdf_path)
+
+        # ✔ Table → Document 변환
+        table_docs = convert_tables_to_documents(tables)
+        docs.extend(stamp_source(table_docs, pdf_path, name, "camelot"))
 
     # ✔ Chroma 저장
-    save_table_vectorstore(docs, out_dir)
+    _report(progress, "embed_tables")
+    if not docs:
+        print(f"⚠ No table docs found. Retiring {name}.")
+        retire(name)
+        update_store_terms(name, [])
+        return
+    _build_and_promote(name, docs, save_table_vectorstore, _stage_reporter(progress, "embed_tables"))
 
 
-def build_vectorstore_for_single_file(pdf_path):
-    doc_type = detect_doc_type(pdf_path)
+def build_stores_for_shard(info, pdf_paths, progress=None):
+    """
+    shard(doc_type + 시즌 + 발행본)의 text / table store를 pdf_paths 전체로 새로 빌드
+    → manifest에 live store 목록 기록.
+    progress(stage, fraction) : BUILD_STAGES 순서로 호출됨 (job queue 진행률용)
+    """
+    shard = info["shard"]
+    build_text_store(pdf_paths, f"{shard}_text", progress)
+    build_table_store(pdf_paths, f"{shard}_tables", progress)
 
-    text_dir = f"output/chroma/{doc_type}_text"
-    table_dir = f"output/chroma/{doc_type}_tables"
+    stores = [
+        name for name in (f"{shard}_text", f"{shard}_tables")
+        if os.path.islink(live_path(name))
+    ]
+    update_manifest(info, pdf_paths, stores)
+    if stores:
+        retire_legacy_stores(info["doc_type"])
 
-    build_text_store(pdf_path, text_dir)
-    build_table_store(pdf_path, table_dir)
+
+def retire_legacy_stores(doc_type):
+    """
+    sharding 이전 빌드의 store (<doc_type>_text / _tables, manifest에 없음)는
+    같은 doc_type의 shard가 promote 되면 retire → 예전 규정이 계속 검색되지 않도록.
+    """
+    managed = managed_stores()
+    for name in (f"{doc_type}_text", f"{doc_type}_tables"):
+        if name in managed or not os.path.lexists(live_path(name)):
+            continue
+        retire(name)
+        update_store_terms(name, [])
 
 
 # -----------------------------
 # data 폴더 전체 자동 처리
 # -----------------------------
+def list_data_pdfs(data_dir="data"):
+    return sorted(
+        os.path.join(data_dir, f)
+        for f in os.listdir(data_dir)
+        if f.endswith(".pdf")
+    )
+
+
+def group_pdfs_by_shard(pdf_paths):
+    """
+    반환: {shard 이름: (shard info, pdf_paths)}
+    """
+    groups = {}
+    for pdf_path in pdf_paths:
+        info = detect_shard(pdf_path, detect_doc_type(pdf_path))
+        groups.setdefault(info["shard"], (info, []))[1].append(pdf_path)
+    return groups
+
+
+def build_vectorstore_for_single_file(pdf_path, progress=None):
+    """
+    업로드한 PDF가 속한 shard store를 다시 빌드.
+    (같은 doc_type / 시즌 / 발행본의 data 폴더 PDF 전체 + 업로드 파일)
+    """
+    info = detect_shard(pdf_path, detect_doc_type(pdf_path))
+    _, same_shard = group_pdfs_by_shard(list_data_pdfs()).get(info["shard"], (info, []))
+
+    pdf_paths = same_shard
+    if os.path.abspath(pdf_path) not in {os.path.abspath(p) for p in same_shard}:
+        pdf_paths = same_shard + [pdf_path]
+
+    build_stores_for_shard(info, pdf_paths, progress)
+
+
 def build_all_vectorstores_from_data():
-    data_dir = "data"
-    pdf_files = [f for f in os.listdir(data_dir) if f.endswith(".pdf")]
+    pdf_files = list_data_pdfs()
 
     if not pdf_files:
         print("❌ No PDF files found.")
         return
 
-    for pdf in pdf_files:
-        pdf_path = os.path.join(data_dir, pdf)
-        build_vectorstore_for_single_file(pdf_path)
+    for info, pdf_paths in group_pdfs_by_shard(pdf_files).values():
+        build_stores_for_shard(info, pdf_paths)
 
 
 # 실행용
@@ -0,0 +1,44 @@
+"""
+여러 프로세스(Streamlit / uvicorn worker)가 같은 JSON 파일을 read-modify-write 할 때 쓰는 lock.
+
+    with file_lock(MANIFEST_PATH):
+        data = json.load(...)
+        ...
+        os.replace(tmp, MANIFEST_PATH)
+
+<path>.lock sidecar 파일에 fcntl.flock (프로세스 간) + threading.Lock (같은 프로세스 thread 간).
+fcntl이 없는 환경(Windows)에서는 thread lock만 적용.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_thread_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _thread_lock(path):
+    with _registry_lock:
+        return _thread_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def file_lock(path):
+    lock_path = os.path.abspath(path) + ".lock"
+    with _thread_lock(lock_path):
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
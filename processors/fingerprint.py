@@ -0,0 +1,156 @@
+import re
+import hashlib
+
+# -----------------------------------------------------------
+# 0. 설정
+# -----------------------------------------------------------
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+MAX_HAMMING = 3          # 64bit 중 3bit 이하 차이 → near-duplicate 후보
+BANDS = MAX_HAMMING + 1  # pigeonhole: 4 band 중 최소 1개는 정확히 일치
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_NUMBER_WORDS = {
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "fifteen", "twenty", "thirty", "fifty", "hundred", "thousand",
+    "first", "second", "third", "half", "double", "twice",
+}
+_BAND_BITS = SIMHASH_BITS // BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+# -----------------------------------------------------------
+# 1. SimHash fingerprint
+# -----------------------------------------------------------
+def _shingles(text):
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return [" ".join(words)] if words else []
+    return [
+        " ".join(words[i:i + SHINGLE_SIZE])
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    ]
+
+
+def simhash(text: str) -> int:
+    """
+    word 3-gram shingle 기반 64bit SimHash.
+    공백 / 대소문자 / 일부 단어 차이는 hamming distance 몇 bit 차이로만 나타남.
+    """
+    weights = [0] * SIMHASH_BITS
+
+    for sh in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(sh.encode("utf-8"), digest_size=8).digest(), "big")
+        for b in range(SIMHASH_BITS):
+            weights[b] += 1 if (h >> b) & 1 else -1
+
+    fp = 0
+    for b in range(SIMHASH_BITS):
+        if weights[b] > 0:
+            fp |= 1 << b
+    return fp
+
+
+def to_hex(fp: int) -> str:
+    return f"{fp:016x}"
+
+
+def doc_fingerprint(doc) -> int:
+    """
+    ingestion 때 저장된 metadata["simhash"]가 있으면 재사용, 없으면 계산.
+    """
+    stored = doc.metadata.get("simhash")
+    if stored:
+        try:
+            return int(stored, 16)
+        except (TypeError, ValueError):
+            pass
+    return simhash(doc.page_content)
+
+
+def guard_key(text: str, metadata=None) -> str:
+    """
+    SimHash가 가까워도 이 key가 같을 때만 near-duplicate로 합침.
+
+    SimHash 3bit 이내는 "race" ↔ "sprint", "five" ↔ "ten second penalty" 같은
+    한 단어 차이도 포함하므로 규정 문장에는 그대로 쓰면 안 됨.
+    - section이 있으면: 같은 section + 같은 숫자(숫자 단어 포함) 집합
+    - section이 없으면: 정규화한 텍스트가 완전히 같을 때만
+    """
+    section = (metadata or {}).get("section")
+    if section:
+        words = _WORD.findall(text.lower())
+        numbers = set(_NUMBER.findall(text)) | {w for w in words if w in _NUMBER_WORDS}
+        return f"s:{section}:" + ",".join(sorted(numbers))
+
+    normalized = " ".join(_WORD.findall(text.lower()))
+    return "x:" + hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def doc_guard(doc) -> str:
+    return guard_key(doc.page_content, doc.metadata)
+
+
+# -----------------------------------------------------------
+# 2. Near-duplicate index (band lookup → O(1) 후보 조회)
+# -----------------------------------------------------------
+class NearDuplicateIndex:
+    """
+    SimHash를 4개 band로 나눠 dict에 저장.
+    hamming distance ≤ 3 인 fingerprint는 최소 1개 band가 완전히 같으므로
+    band key 조회만으로 후보를 찾고, 후보 중 guard_key가 같은 것만 bit 비교.
+    """
+
+    def __init__(self, max_distance: int = MAX_HAMMING):
+        self.max_distance = max_distance
+        self._buckets = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _band_keys(fp):
+        return [(i, (fp >> (i * _BAND_BITS)) & _BAND_MASK) for i in range(BANDS)]
+
+    def find(self, fp: int, guard: str):
+        for key in self._band_keys(fp):
+            for other, other_guard in self._buckets.get(key, ()):
+                if other_guard == guard and bin(fp ^ other).count("1") <= self.max_distance:
+                    return other
+        return None
+
+    def add(self, fp: int, guard: str):
+        for key in self._band_keys(fp):
+            self._buckets.setdefault(key, []).append((fp, guard))
+        self._count += 1
+
+    def add_if_new(self, fp: int, guard: str) -> bool:
+        """
+        새 fingerprint면 등록 후 True, near-duplicate면 False.
+        """
+        if self.find(fp, guard) is not None:
+            return False
+        self.add(fp, guard)
+        return True
+
+
+# -----------------------------------------------------------
+# 3. Document 리스트 near-duplicate 제거
+# -----------------------------------------------------------
+def collapse_near_duplicates(docs):
+    """
+    Document 리스트에서 near-duplicate를 제거하고 metadata["simhash"]를 채움.
+    (build마다 새 staging 디렉토리에 처음부터 저장하므로 기존 store와는 비교하지 않음)
+    """
+    index = NearDuplicateIndex()
+    unique = []
+
+    for d in docs:
+        fp = doc_fingerprint(d)
+        d.metadata["simhash"] = to_hex(fp)
+        if index.add_if_new(fp, doc_guard(d)):
+            unique.append(d)
+
+    return unique
@@ -0,0 +1,362 @@
+"""
+F1 규정 bilingual glossary (영문 용어 ↔ 한국어 표현).
+
+- ingestion 시 store chunk에서 용어 빈도를 집계해 output/glossary.json 갱신
+- 검색 시 한국어 질문 → 원문 + 영문 용어 검색어를 LLM 호출 없이 로컬에서 생성 (expand_query)
+
+    python -m processors.glossary build            # live store 전체로 다시 집계
+    python -m processors.glossary expand "세이프티카 상황에서 피트레인 진입"
+"""
+import os
+import re
+import json
+import threading
+import unicodedata
+from collections import Counter
+
+from processors.file_lock import file_lock
+
+# -----------------------------------------------------------
+# 0. 설정
+# -----------------------------------------------------------
+GLOSSARY_PATH = os.getenv("RAG_GLOSSARY_PATH", "output/glossary.json")
+MIN_DF = int(os.getenv("RAG_GLOSSARY_MIN_DF", "3"))  # 자동 추출 용어의 최소 chunk 수
+MAX_MINED_TERMS = 300
+MIN_COVERAGE = float(os.getenv("RAG_GLOSSARY_MIN_COVERAGE", "0.5"))  # 용어가 덮어야 하는 내용어 글자 비율
+ENGLISH_RATIO = 0.8  # 알파벳 중 ASCII 비율이 이 이상이면 영어 질문으로 봄
+
+# 기본 용어집 (영문 → 한국어 표현들)
+# 코퍼스에 실제로 등장하는 용어만 glossary.json에 들어감
+SEED_TERMS = {
+    "parc ferme": ["파크페르메", "파르크페르메", "파크 페르메", "차량보관", "차량 보관"],
+    "safety car": ["세이프티카", "세이프티 카", "안전차", "안전 차량"],
+    "virtual safety car": ["버추얼세이프티카", "버추얼 세이프티카", "가상세이프티카", "vsc"],
+    "pit lane": ["피트레인", "피트 레인", "피트로드"],
+    "pit stop": ["피트스톱", "피트 스톱", "피트인"],
+    "pit entry": ["피트진입", "피트 진입", "피트레인 진입"],
+    "pit exit": ["피트출구", "피트 출구", "피트레인 출구"],
+    "tyre allocation": ["타이어할당", "타이어 할당", "타이어 배정"],
+    "tyres": ["타이어"],
+    "wet weather tyres": ["웻타이어", "웻 타이어", "우천용타이어", "우천 타이어"],
+    "intermediate tyres": ["인터미디어트", "인터 타이어"],
+    "starting grid": ["스타팅그리드", "스타팅 그리드", "출발그리드", "그리드"],
+    "grid penalty": ["그리드페널티", "그리드 페널티", "그리드 강등"],
+    "time penalty": ["타임페널티", "타임 페널티", "시간 페널티"],
+    "drive through penalty": ["드라이브스루", "드라이브 스루"],
+    "stop and go penalty": ["스톱앤고", "스톱 앤 고"],
+    "penalty": ["페널티", "패널티", "벌칙", "징계"],
+    "penalty points": ["벌점", "페널티 포인트"],
+    "stewards": ["스튜어드", "심판", "심사위원"],
+    "race director": ["레이스디렉터", "레이스 디렉터", "경기감독", "경기 감독"],
+    "red flag": ["레드플래그", "레드 플래그", "적기", "빨간 깃발"],
+    "yellow flag": ["옐로플래그", "옐로우 플래그", "황색기", "노란 깃발"],
+    "blue flag": ["블루플래그", "블루 플래그", "청색기", "파란 깃발"],
+    "chequered flag": ["체커기", "체커 플래그", "체커드 플래그"],
+    "race suspension": ["경기중단", "레이스 중단", "경기 중단"],
+    "formation lap": ["포메이션랩", "포메이션 랩"],
+    "qualifying": ["퀄리파잉", "예선"],
+    "sprint": ["스프린트"],
+    "practice session": ["연습주행", "프리 프랙티스", "연습 세션"],
+    "points": ["포인트", "점수", "득점"],
+    "championship": ["챔피언십", "선수권"],
+    "power unit": ["파워유닛", "파워 유닛", "엔진"],
+    "gearbox": ["기어박스"],
+    "drs": ["drs", "디알에스"],
+    "track limits": ["트랙리밋", "트랙 리밋", "트랙 이탈"],
+    "unsafe release": ["언세이프릴리즈", "언세이프 릴리즈", "위험한 출발"],
+    "weighing": ["계측", "무게측정", "중량 측정"],
+    "scrutineering": ["차량검차", "차량 검차", "검차"],
+    "curfew": ["통행금지", "커퓨"],
+    "team personnel": ["팀 인원", "팀 관계자", "팀원"],
+    "race distance": ["레이스거리", "레이스 거리", "경기 거리"],
+    "overtaking": ["추월", "오버테이크"],
+    "fuel": ["연료"],
+    "speed limit": ["속도제한", "속도 제한", "제한속도", "제한 속도"],
+    "protest": ["항의", "이의제기", "이의 제기"],
+    "appeal": ["항소"],
+}
+
+# coverage 계산 시 빼는 한국어 조사 / 어미 (긴 것부터) 와 내용 없는 단어
+_KO_ENDINGS = sorted([
+    "에서는", "으로는", "에서", "에게", "으로", "까지", "부터", "보다", "처럼", "에는", "에도",
+    "한가요", "인가요", "하나요", "되나요", "할까요", "인지", "합니까", "입니까", "인가", "한가",
+    "가요", "나요", "해요", "이에요", "예요", "하면", "되면", "하는", "되는", "하고",
+    # "도" / "의" / "과" / "로"는 속도 / 항의 / 결과 / 도로처럼 명사 끝과 겹쳐서 제외
+    "은", "는", "이", "가", "을", "를", "에", "와", "만", "한", "된", "할",
+], key=len, reverse=True)
+_KO_STOPWORDS = {
+    "상황", "경우", "가능", "무엇", "뭐", "뭔가", "어떻게", "어떤", "언제", "왜", "규정", "관련",
+    "내용", "대해", "대한", "알려줘", "알려주세요", "설명", "설명해줘", "있나요", "있어", "있는",
+    "수", "때", "시", "중", "및", "또는", "그리고", "것", "무슨", "얼마", "몇", "f1", "fia",
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_lock = threading.Lock()
+_cache = {"mtime": None, "glossary": None, "matcher": None}
+
+
+def _strip_accent(c):
+    # Latin 문자만 accent 제거 — 한글을 NFKD로 풀면 자모로 쪼개짐
+    if c.isascii() or "LATIN" not in unicodedata.name(c, ""):
+        return c
+    return "".join(d for d in unicodedata.normalize("NFKD", c) if not unicodedata.combining(d))
+
+
+def normalize(text: str) -> str:
+    # 소문자 + NFC + Latin accent 제거 (parc fermé → parc ferme, 한글 음절은 그대로)
+    text = unicodedata.normalize("NFC", text.lower())
+    if text.isascii():
+        return text
+    return "".join(_strip_accent(c) for c in text)
+
+
+def _compact(text: str) -> str:
+    # 한국어 표현은 띄어쓰기 차이 무시
+    return re.sub(r"\s+", "", normalize(text))
+
+
+# -----------------------------------------------------------
+# 1. Ingestion — 코퍼스 용어 집계
+# -----------------------------------------------------------
+_CAPITALISED = re.compile(r"\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3})\b")
+_LEADING_STOPWORDS = {"the", "a", "an", "any", "all", "each", "if", "when", "in", "this", "no", "for", "during"}
+
+
+def _defined_terms(text):
+    # 문장 첫 단어 (The Safety Car → safety car) 제거
+    terms = set()
+    for phrase in _CAPITALISED.findall(text):
+        words = normalize(phrase).split()
+        while words and words[0] in _LEADING_STOPWORDS:
+            words = words[1:]
+        if len(words) >= 2:
+            terms.add(" ".join(words))
+    return terms
+
+
+def mine_terms(texts):
+    """
+    chunk 텍스트 리스트 → {영문 용어: 등장 chunk 수}
+
+    - SEED_TERMS 중 실제로 등장하는 용어
+    - 대문자로 시작하는 2~4 단어 정의어 (Safety Car, Race Director 등), MIN_DF 이상
+    """
+    seed_patterns = {
+        term: re.compile(r"\b" + re.escape(term) + r"\b") for term in SEED_TERMS
+    }
+    df = Counter()
+
+    for text in texts:
+        norm = normalize(text)
+        found = {term for term, pat in seed_patterns.items() if pat.search(norm)}
+        found.update(_defined_terms(text))
+        df.update(found)
+
+    mined = {t: n for t, n in df.items() if t in SEED_TERMS or n >= MIN_DF}
+    top = sorted(mined.items(), key=lambda kv: -kv[1])[:MAX_MINED_TERMS]
+    return dict(top)
+
+
+def _load_file():
+    if not os.path.exists(GLOSSARY_PATH):
+        return {"terms": {}}
+    with open(GLOSSARY_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update_store_terms(store_name, docs):
+    """
+    store 1개 빌드 결과로 glossary 갱신 (해당 store 집계만 교체).
+    docs가 비어 있으면 해당 store 집계 제거 (retire).
+
+    glossary.json 항목:
+        {"terms": {"safety car": {"ko": [...], "stores": {"sporting_text": 42}}}}
+    """
+    counts = mine_terms(d.page_content for d in docs)
+
+    # 다른 프로세스의 job worker도 같은 파일을 고치므로 파일 lock으로 직렬화
+    with file_lock(GLOSSARY_PATH):
+        data = _load_file()
+        terms = data.setdefault("terms", {})
+
+        for term, entry in list(terms.items()):
+            entry.get("stores", {}).pop(store_name, None)
+            if not entry.get("stores"):
+                del terms[term]
+
+        for term, n in counts.items():
+            entry = terms.setdefault(term, {"ko": SEED_TERMS.get(term, []), "stores": {}})
+            entry["ko"] = SEED_TERMS.get(term, entry.get("ko", []))
+            entry["stores"][store_name] = n
+
+        os.makedirs(os.path.dirname(GLOSSARY_PATH) or ".", exist_ok=True)
+        tmp = GLOSSARY_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, GLOSSARY_PATH)
+
+    print(f"✓ Glossary updated for {store_name}: {len(counts)} terms")
+
+
+# -----------------------------------------------------------
+# 2. 검색 — 로컬 query expansion
+# -----------------------------------------------------------
+def _build_matcher(terms):
+    """
+    (패턴, 영문 용어) 리스트. 긴 표현부터 매칭해서
+    "버추얼세이프티카"가 "세이프티카"보다 먼저 잡히도록 함.
+    """
+    patterns = []
+    for term, entry in terms.items():
+        patterns.append((_compact(term), term))
+        for ko in entry.get("ko", []):
+            patterns.append((_compact(ko), term))
+    patterns.sort(key=lambda p: -len(p[0]))
+    return patterns
+
+
+def load_glossary():
+    """
+    output/glossary.json (파일이 바뀌었을 때만 다시 읽음).
+    반환: (glossary dict, matcher)
+    """
+    mtime = os.path.getmtime(GLOSSARY_PATH) if os.path.exists(GLOSSARY_PATH) else None
+
+    with _lock:
+        if _cache["glossary"] is None or _cache["mtime"] != mtime:
+            data = _load_file()
+            _cache["glossary"] = data.get("terms", {})
+            _cache["matcher"] = _build_matcher(_cache["glossary"])
+            _cache["mtime"] = mtime
+        return _cache["glossary"], _cache["matcher"]
+
+
+def _content_letters(query: str) -> int:
+    """
+    질문의 내용어 글자 수 — 조사 / 어미를 떼고 불용어("상황", "가능" 등)는 제외.
+    "세이프티카 상황에서 추월 가능한가요?" → 세이프티카 + 추월 = 7
+    """
+    total = 0
+    for word in _WORD.findall(normalize(query)):
+        if word.isdigit():
+            continue
+        for ending in _KO_ENDINGS:
+            if len(word) > len(ending) and word.endswith(ending):
+                word = word[:-len(ending)]
+                break
+        if word not in _KO_STOPWORDS:
+            total += sum(1 for c in word if c.isalpha())
+    return total
+
+
+def _match(query: str):
+    """
+    반환: (용어 리스트 — 질문 내 등장 순서, 용어가 덮은 글자 수, 내용어 글자 수)
+    글자 수는 NFC 기준 (한글은 음절 단위), 공백 / 문장부호 / 숫자 제외.
+    """
+    glossary, matcher = load_glossary()
+    q = _compact(query)
+
+    hits = []
+    covered = 0
+    for pattern, term in matcher:
+        pos = q.find(pattern)
+        if not pattern or pos < 0:
+            continue
+        # 매칭된 부분은 지워서 더 짧은 표현과 중복 매칭 방지
+        q = q[:pos] + "\0" * len(pattern) + q[pos + len(pattern):]
+        covered += sum(1 for c in pattern if c.isalpha())
+        if term not in (t for _, t in hits):
+            hits.append((pos, term))
+
+    total = _content_letters(query)
+    return [term for _, term in sorted(hits)], min(covered, total), total
+
+
+def match_terms(query: str):
+    """
+    질문에 등장하는 glossary 용어 (질문 내 등장 순서).
+    """
+    return _match(query)[0]
+
+
+def is_mostly_english(query: str) -> bool:
+    letters = [c for c in query if c.isalpha()]
+    if not letters:
+        return True
+    return sum(1 for c in letters if c.isascii()) / len(letters) >= ENGLISH_RATIO
+
+
+def expand_query(query: str):
+    """
+    검색용 영문 query (LLM 호출 없이).
+
+    - 영어 위주 질문 → 번역 불필요, 원문 그대로
+    - 한국어 질문 → 원문 + glossary 영문 용어 (원문의 나머지 정보는 그대로 유지)
+    - coverage = 용어가 덮은 글자 / 내용어 글자 (조사 / 어미 / 불용어 제외)
+      MIN_COVERAGE 미만이면 None → 호출하는 쪽에서 LLM 번역
+      예: "피트레인 속도 제한은?" → 피트레인 + 속도 제한 = 8/8 → 로컬 확장
+          "세이프티카 때 드라이버 대기 위치는?" → 5/13 → LLM 번역
+    """
+    if is_mostly_english(query):
+        return query
+
+    terms, covered, total = _match(query)
+    if not terms:
+        return None
+    if total and covered / total < MIN_COVERAGE:
+        return None
+
+    return f"{query} {' '.join(terms)}"
+
+
+def term_stores(terms):
+    """
+    용어들이 등장한 store별 chunk 수 합계 (route_query용).
+    """
+    glossary, _ = load_glossary()
+    totals = Counter()
+    for term in terms:
+        totals.update(glossary.get(term, {}).get("stores", {}))
+    return dict(totals)
+
+
+# -----------------------------------------------------------
+# 3. CLI
+# -----------------------------------------------------------
+def rebuild_from_live_stores():
+    from processors.index_tools import _fetch_all, _open, list_stores
+
+    class _Text:
+        def __init__(self, text):
+            self.page_content = text
+
+    for name in list_stores():
+        store, _ = _open(name)
+        data = _fetch_all(store._collection, ["documents"])
+        update_store_terms(name, [_Text(t) for t in data["documents"]])
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="F1 규정 glossary")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build")
+    p_expand = sub.add_parser("expand")
+    p_expand.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        rebuild_from_live_stores()
+    else:
+        terms = match_terms(args.query)
+        print(json.dumps({
+            "query_en": expand_query(args.query),
+            "terms": terms,
+            "stores": term_stores(terms),
+        }, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
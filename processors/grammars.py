@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_right
+
+from langchain_core.documents import Document
+
+# -----------------------------------------------------------
+# 0. 문서 family별 grammar (모듈 로드 시 1번만 compile)
+# -----------------------------------------------------------
+# FIA 규정 section 문자
+#   B = Sporting, C = Technical, D / E = Financial, F = Operational
+FAMILY_LETTERS = {
+    "sporting": "B",
+    "technical": "C",
+    "financial": "DE",
+    "operational": "F",
+}
+
+MIN_ARTICLE_BODY = 15
+MIN_SECTION_TEXT = 5
+
+
+def make_grammar(name, letters):
+    """
+    - article : "ARTICLE C3: BODYWORK ..." / "APPENDIX 2 ..." / "ANNEX A ..." 제목 줄
+    - section : "C3.5.2" 형태 조항 번호
+                ("Article C3.5" 같은 본문 내 참조는 경계로 보지 않음)
+    """
+    cls = f"[{letters}]"
+    return {
+        "name": name,
+        "article": re.compile(
+            rf"(ARTICLE\s+{cls}\d+(?::)?[^\n]*"
+            rf"|(?m:^[ \t]*(?:ANNEX|APPENDIX)\s+[A-Z0-9]+\b[^\n]*))"
+        ),
+        "section": re.compile(rf"(?<!Article )(?<!Articles )\b({cls}\d+(?:\.\d+)+)\b"),
+    }
+
+
+GRAMMARS = {name: make_grammar(name, letters) for name, letters in FAMILY_LETTERS.items()}
+
+
+# -----------------------------------------------------------
+# 1. Page offset (chunk마다 시작 page 기록)
+# -----------------------------------------------------------
+def combine_pages(pages):
+    """
+    반환: (전체 텍스트, page 시작 offset 리스트, page 번호 리스트)
+    """
+    parts, starts, numbers = [], [], []
+    offset = 0
+    for i, p in enumerate(pages):
+        starts.append(offset)
+        numbers.append(p.metadata.get("page", i))
+        parts.append(p.page_content + "\n")
+        offset += len(parts[-1])
+    return "".join(parts), starts, numbers
+
+
+def _page_at(offset, starts, numbers):
+    if not starts:
+        return None
+    return numbers[max(0, bisect_right(starts, offset) - 1)]
+
+
+# -----------------------------------------------------------
+# 2. ARTICLE / ANNEX / APPENDIX split
+# -----------------------------------------------------------
+def split_articles(text, grammar):
+    """
+    반환: [(제목, 본문, 본문 시작 offset), ...]
+    """
+    matches = list(grammar["article"].finditer(text))
+    articles = []
+
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        raw = text[m.end():end]
+        body = raw.strip()
+
+        # 목차 줄처럼 본문이 거의 없는 제목은 skip
+        if len(body) < MIN_ARTICLE_BODY:
+            continue
+
+        articles.append((m.group(1).strip(), body, m.end() + (len(raw) - len(raw.lstrip()))))
+
+    return articles
+
+
+# -----------------------------------------------------------
+# 3. SECTION split
+# -----------------------------------------------------------
+def split_sections(article_title, body, grammar, base_offset=0, starts=(), numbers=()):
+    """
+    조항 번호 기준으로 본문을 나눔.
+    번호 앞 부분은 "intro" section (ANNEX / APPENDIX는 보통 전체가 intro).
+    """
+    matches = list(grammar["section"].finditer(body))
+    sections = []
+
+    def add(section_id, start, end):
+        raw = body[start:end]
+        text = raw.strip()
+        if len(text) < MIN_SECTION_TEXT:
+            return
+        metadata = {"article": article_title, "section": section_id}
+        page = _page_at(base_offset + start, starts, numbers)
+        if page is not None:
+            metadata["page"] = page
+        sections.append(Document(page_content=text, metadata=metadata))
+
+    intro_end = matches[0].start() if matches else len(body)
+    if len(body[:intro_end].strip()) > MIN_SECTION_TEXT:
+        add("intro", 0, intro_end)
+
+    for i, m in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(body)
+        add(m.group(1), m.end(), end)
+
+    return sections
+
+
+# -----------------------------------------------------------
+# 4. 문서 전체 파싱 (family 자동 선택)
+# -----------------------------------------------------------
+def parse_with_grammar(pages, grammar):
+    text, starts, numbers = combine_pages(pages)
+    sections = []
+    for title, body, offset in split_articles(text, grammar):
+        sections.extend(split_sections(title, body, grammar, offset, starts, numbers))
+    return sections
+
+
+def _article_count(text, grammar):
+    # ANNEX / APPENDIX는 family와 무관하게 잡히므로 ARTICLE 제목만 셈
+    return sum(1 for title, _, _ in split_articles(text, grammar) if title.startswith("ARTICLE"))
+
+
+def detect_grammar(pages, doc_type=None):
+    """
+    doc_type grammar 우선, ARTICLE이 하나도 안 잡히면 나머지 grammar 중
+    article을 가장 많이 찾은 것을 사용. 모두 실패하면 None (→ fallback chunking).
+    """
+    text, _, _ = combine_pages(pages)
+
+    preferred = GRAMMARS.get(doc_type)
+    if preferred and _article_count(text, preferred):
+        return preferred
+
+    best, best_count = None, 0
+    for grammar in GRAMMARS.values():
+        count = _article_count(text, grammar)
+        if count > best_count:
+            best, best_count = grammar, count
+    return best
@@ -0,0 +1,306 @@
+"""
+output/chroma store 점검 / compaction 도구.
+
+    python -m processors.index_tools stats
+    python -m processors.index_tools stats --json
+    python -m processors.index_tools compact sporting_text --dry-run
+    python -m processors.index_tools compact --all
+    python -m processors.index_tools --data-dir /srv/rag/data stats
+
+원본 PDF 폴더(--data-dir, 기본 RAG_DATA_DIR 또는 data)를 찾을 수 없으면
+orphan / stale 판단은 건너뜀 (중복만 분류).
+"""
+import os
+import json
+import argparse
+import hashlib
+
+from langchain_chroma import Chroma
+
+from clients import get_embeddings
+from processors.build_vectorstores import file_sha1, list_data_pdfs
+from processors.fingerprint import NearDuplicateIndex, doc_fingerprint, guard_key
+from processors.store_profile import build_profile
+from processors.store_swap import LIVE_DIR, new_staging_dir, validate_store, promote, discard
+
+PAGE_SIZE = 1000
+DATA_DIR = os.getenv("RAG_DATA_DIR", "data")
+
+
+# -----------------------------------------------------------
+# 1. Store 로드
+# -----------------------------------------------------------
+def list_stores():
+    if not os.path.isdir(LIVE_DIR):
+        return []
+    return sorted(
+        f for f in os.listdir(LIVE_DIR)
+        if not f.startswith(".") and os.path.isdir(os.path.join(LIVE_DIR, f))
+    )
+
+
+def _open(name):
+    path = os.path.realpath(os.path.join(LIVE_DIR, name))
+    return Chroma(persist_directory=path, embedding_function=get_embeddings()), path
+
+
+def _fetch_all(collection, include):
+    """
+    collection 전체를 PAGE_SIZE 단위로 읽음.
+    """
+    out = {"ids": [], **{k: [] for k in include}}
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=include)
+        if not page["ids"]:
+            break
+        out["ids"].extend(page["ids"])
+        for k in include:
+            out[k].extend(page[k])
+        offset += len(page["ids"])
+    return out
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+class _Doc:
+    # doc_fingerprint()용 최소 Document 형태
+    def __init__(self, text, metadata):
+        self.page_content = text
+        self.metadata = metadata
+
+
+# -----------------------------------------------------------
+# 2. Chunk 분류 (중복 / orphan / stale)
+# -----------------------------------------------------------
+def _current_sources(data_dir=DATA_DIR):
+    """
+    data 폴더 PDF → {파일명: sha1}
+    폴더가 없거나 PDF가 하나도 없으면 None — 다른 작업 디렉토리에서 실행한 경우 등
+    (빈 dict로 두면 모든 chunk가 orphan으로 분류됨)
+    """
+    if not os.path.isdir(data_dir):
+        print(f"⚠ Source directory not found: {data_dir} — orphan / stale check skipped")
+        return None
+    pdfs = list_data_pdfs(data_dir)
+    if not pdfs:
+        print(f"⚠ No PDFs in {data_dir} — orphan / stale check skipped")
+        return None
+    return {os.path.basename(p): file_sha1(p) for p in pdfs}
+
+
+def classify_chunks(documents, metadatas, sources):
+    """
+    chunk마다 "keep" / "exact_dup" / "near_dup" / "orphan" / "stale" / "untracked" 중 하나.
+
+    - orphan    : data 폴더에 더 이상 없는 PDF의 chunk
+    - stale     : 같은 파일명이지만 내용(sha1)이 바뀐 이전 버전 chunk
+    - untracked : source metadata가 없는 예전 빌드 chunk (유지)
+    sources가 None (원본 폴더를 못 찾음)이면 orphan / stale 분류는 하지 않음.
+    """
+    exact_seen = set()
+    near_index = NearDuplicateIndex()
+
+    labels = []
+    for text, meta in zip(documents, metadatas):
+        meta = meta or {}
+        source = meta.get("source")
+
+        if sources is not None and source:
+            if source not in sources:
+                labels.append("orphan")
+                continue
+            if meta.get("source_sha1") and meta["source_sha1"] != sources[source]:
+                labels.append("stale")
+                continue
+
+        digest = hashlib.sha1(text.strip().encode("utf-8")).hexdigest()
+        if digest in exact_seen:
+            labels.append("exact_dup")
+            continue
+        exact_seen.add(digest)
+
+        if not near_index.add_if_new(doc_fingerprint(_Doc(text, meta)), guard_key(text, meta)):
+            labels.append("near_dup")
+            continue
+
+        labels.append("keep" if source else "untracked")
+
+    return labels
+
+
+# -----------------------------------------------------------
+# 3. 통계
+# -----------------------------------------------------------
+def _distribution(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pct(q):
+        return values[min(len(values) - 1, int(q * (len(values) - 1)))]
+
+    return {
+        "min": values[0],
+        "p50": pct(0.5),
+        "p90": pct(0.9),
+        "max": values[-1],
+        "mean": round(sum(values) / len(values), 1),
+    }
+
+
+def store_stats(name, sources):
+    store, path = _open(name)
+    collection = store._collection
+
+    data = _fetch_all(collection, ["documents", "metadatas"])
+    documents, metadatas = data["documents"], data["metadatas"]
+    count = len(documents)
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    dim = len(sample["embeddings"][0]) if sample["ids"] else 0
+
+    labels = classify_chunks(documents, metadatas, sources)
+    label_counts = {}
+    for lb in labels:
+        label_counts[lb] = label_counts.get(lb, 0) + 1
+
+    lengths_by_chunker = {}
+    for text, meta in zip(documents, metadatas):
+        chunker = (meta or {}).get("chunker") or (
+            "fallback" if (meta or {}).get("section") == "fallback" else "unknown"
+        )
+        lengths_by_chunker.setdefault(chunker, []).append(len(text))
+
+    removable = count - label_counts.get("keep", 0) - label_counts.get("untracked", 0)
+
+    return {
+        "store": name,
+        "path": path,
+        "chunks": count,
+        "dim": dim,
+        "disk_bytes": _dir_size(path),
+        "labels": label_counts,
+        "duplicate_ratio": round(
+            (label_counts.get("exact_dup", 0) + label_counts.get("near_dup", 0)) / count, 4
+        ) if count else 0.0,
+        "removable": removable,
+        "sources_checked": sources is not None,
+        "sources": sorted({(m or {}).get("source") for m in metadatas if (m or {}).get("source")}),
+        "chunk_length": {k: _distribution(v) for k, v in lengths_by_chunker.items()},
+    }
+
+
+def all_stats(data_dir=DATA_DIR):
+    sources = _current_sources(data_dir)
+    return [store_stats(name, sources) for name in list_stores()]
+
+
+# -----------------------------------------------------------
+# 4. Compaction (중복 / orphan / stale 제거 후 새 build로 promote)
+# -----------------------------------------------------------
+def compact_store(name, dry_run: bool = False, data_dir=DATA_DIR, sources=None):
+    """
+    keep / untracked chunk만 새 staging store로 복사 (embedding 재계산 없음).
+    새 Chroma collection에 다시 넣으므로 HNSW index도 처음부터 재구성됨.
+    원본 폴더를 못 찾으면 중복만 제거 (orphan / stale은 유지).
+    """
+    store, path = _open(name)
+    data = _fetch_all(store._collection, ["documents", "metadatas", "embeddings"])
+
+    if sources is None:
+        sources = _current_sources(data_dir)
+    labels = classify_chunks(data["documents"], data["metadatas"], sources)
+    keep = [i for i, lb in enumerate(labels) if lb in ("keep", "untracked")]
+
+    report = {
+        "store": name,
+        "before": len(labels),
+        "after": len(keep),
+        "removed": len(labels) - len(keep),
+        "sources_checked": sources is not None,
+    }
+    if dry_run or report["removed"] == 0 or not keep:
+        report["promoted"] = False
+        return report
+
+    staging = new_staging_dir(name)
+    try:
+        target = Chroma(persist_directory=staging, embedding_function=get_embeddings())
+        for start in range(0, len(keep), PAGE_SIZE):
+            batch = keep[start:start + PAGE_SIZE]
+            target._collection.add(
+                ids=[data["ids"][i] for i in batch],
+                embeddings=[data["embeddings"][i] for i in batch],
+                documents=[data["documents"][i] for i in batch],
+                metadatas=[data["metadatas"][i] for i in batch],
+            )
+
+        validate_store(staging, len(keep))
+        build_profile(staging)
+    except BaseException:
+        discard(staging)
+        raise
+
+    promote(name, staging)
+    report["promoted"] = True
+    report["disk_bytes_before"] = _dir_size(path)
+    report["disk_bytes_after"] = _dir_size(staging)
+    return report
+
+
+# -----------------------------------------------------------
+# 5. CLI
+# -----------------------------------------------------------
+def _print_stats(stats):
+    for s in stats:
+        print(f"\n📦 {s['store']}  ({s['chunks']} chunks, dim={s['dim']}, {s['disk_bytes'] / 1e6:.1f} MB)")
+        print(f"   labels          : {s['labels']}")
+        print(f"   duplicate ratio : {s['duplicate_ratio']:.1%}  · removable: {s['removable']}")
+        if not s["sources_checked"]:
+            print("   (source PDF 폴더 없음 — orphan / stale 미확인)")
+        print(f"   sources         : {', '.join(s['sources']) or '-'}")
+        for chunker, dist in s["chunk_length"].items():
+            print(f"   length[{chunker}] : {dist}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorstore 점검 / compaction")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="원본 PDF 폴더 (orphan / stale 판단용)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_stats = sub.add_parser("stats")
+    p_stats.add_argument("--json", action="store_true")
+
+    p_compact = sub.add_parser("compact")
+    p_compact.add_argument("store", nargs="?")
+    p_compact.add_argument("--all", action="store_true")
+    p_compact.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = all_stats(args.data_dir)
+        if args.json:
+            print(json.dumps(stats, ensure_ascii=False, indent=2))
+        else:
+            _print_stats(stats)
+        return
+
+    names = list_stores() if args.all else [args.store]
+    if not names or names == [None]:
+        parser.error("compact: store 이름 또는 --all 필요")
+
+    sources = _current_sources(args.data_dir)
+    for name in names:
+        print(compact_store(name, dry_run=args.dry_run, data_dir=args.data_dir, sources=sources))
+
+
+if __name__ == "__main__":
+    main()
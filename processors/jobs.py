@@ -0,0 +1,282 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import closing
+
+from processors.build_vectorstores import (
+    BUILD_STAGES,
+    build_stores_for_shard,
+    build_vectorstore_for_single_file,
+    detect_doc_type,
+    group_pdfs_by_shard,
+    list_data_pdfs,
+)
+
+# -----------------------------------------------------------
+# 0. 설정
+# -----------------------------------------------------------
+JOBS_DB = os.getenv("RAG_JOBS_DB", "output/jobs.sqlite3")
+POLL_INTERVAL = 1.0
+WORKER_THREADS = int(os.getenv("RAG_JOB_WORKERS", "2"))
+
+ALL_DOCS = "*"  # 전체 재생성 job의 doc_type (모든 doc_type과 충돌)
+
+_STAGE_OFFSETS = {}
+_offset = 0.0
+for _name, _weight in BUILD_STAGES:
+    _STAGE_OFFSETS[_name] = (_offset, _weight)
+    _offset += _weight
+
+_worker_lock = threading.Lock()
+_workers = []
+_listeners = []
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# -----------------------------------------------------------
+# 1. SQLite job 테이블 (프로세스 재시작 / 여러 프로세스 간 공유)
+# -----------------------------------------------------------
+def _connect():
+    os.makedirs(os.path.dirname(JOBS_DB) or ".", exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            pdf_path TEXT,
+            doc_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            progress REAL DEFAULT 0,
+            eta_seconds REAL,
+            message TEXT,
+            cancel_requested INTEGER DEFAULT 0,
+            worker_pid INTEGER,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL
+        )
+    """)
+    return conn
+
+
+def _update(job_id, **fields):
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with closing(_connect()) as conn:
+        conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+
+# -----------------------------------------------------------
+# 2. Job 등록 / 조회 / 취소
+# -----------------------------------------------------------
+def submit_job(pdf_path: str = None):
+    """
+    pdf_path 없으면 data 폴더 전체 재생성 job.
+    같은 대상의 queued / running job이 있으면 새로 만들지 않고 그 id 반환.
+    """
+    kind = "file" if pdf_path else "all"
+    doc_type = detect_doc_type(pdf_path) if pdf_path else ALL_DOCS
+
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND IFNULL(pdf_path, '') = ? "
+            "AND status IN ('queued', 'running')",
+            (kind, pdf_path or ""),
+        ).fetchone()
+
+        if row:
+            conn.execute("COMMIT")
+            return row["id"]
+
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, pdf_path, doc_type, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+            (kind, pdf_path, doc_type, time.time()),
+        )
+        conn.execute("COMMIT")
+        return cur.lastrowid
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def list_jobs(limit: int = 20):
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def has_active_jobs():
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT COUNT(*) AS n FROM jobs WHERE status IN ('queued', 'running')").fetchone()
+    return row["n"] > 0
+
+
+def cancel_job(job_id: int):
+    """
+    queued → 즉시 cancelled, running → stage 경계에서 중단.
+    """
+    with closing(_connect()) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+            (time.time(), job_id),
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+            (job_id,),
+        )
+
+
+# -----------------------------------------------------------
+# 3. Job 선점 (같은 doc_type 동시 빌드 방지)
+# -----------------------------------------------------------
+def _claim_next_job():
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        running = {
+            r["doc_type"]
+            for r in conn.execute("SELECT doc_type FROM jobs WHERE status = 'running'")
+        }
+
+        job = None
+        for row in conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id"):
+            if ALL_DOCS in running:
+                break
+            if row["doc_type"] == ALL_DOCS and running:
+                continue
+            if row["doc_type"] in running:
+                continue
+            job = dict(row)
+            break
+
+        if job:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, worker_pid = ? WHERE id = ?",
+                (time.time(), os.getpid(), job["id"]),
+            )
+        conn.execute("COMMIT")
+        return job
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, TypeError):
+        return False
+
+
+def _requeue_orphans():
+    """
+    worker 프로세스가 죽어서 running으로 남은 job은 다시 queued로.
+    """
+    with closing(_connect()) as conn:
+        rows = conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        for r in rows:
+            if r["worker_pid"] == os.getpid() or not _pid_alive(r["worker_pid"]):
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', stage = NULL, progress = 0 WHERE id = ?",
+                    (r["id"],),
+                )
+
+
+# -----------------------------------------------------------
+# 4. Job 실행 + 진행률 / ETA
+# -----------------------------------------------------------
+def _make_progress(job, files_total):
+    # files_total = 빌드할 shard 개수 (file job은 1)
+    started = time.time()
+    state = {"group_idx": 0}
+
+    def progress(stage, fraction):
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job["id"],)).fetchone()
+        if row and row["cancel_requested"]:
+            raise JobCancelled()
+
+        offset, weight = _STAGE_OFFSETS.get(stage, (0.0, 0.0))
+        overall = (state["group_idx"] + offset + weight * fraction) / files_total
+
+        elapsed = time.time() - started
+        eta = elapsed / overall * (1 - overall) if overall > 0.01 else None
+
+        label = stage if files_total == 1 else f"[{state['group_idx'] + 1}/{files_total}] {stage}"
+        _update(job["id"], stage=label, progress=round(overall, 4), eta_seconds=eta)
+
+    return progress, state
+
+
+def _run_job(job):
+    if job["kind"] == "file":
+        progress, _ = _make_progress(job, 1)
+        build_vectorstore_for_single_file(job["pdf_path"], progress)
+        return
+
+    groups = group_pdfs_by_shard(list_data_pdfs())
+    if not groups:
+        raise ValueError("No PDF files found.")
+
+    progress, state = _make_progress(job, len(groups))
+
+    for idx, (info, pdf_paths) in enumerate(groups.values()):
+        state["group_idx"] = idx
+        build_stores_for_shard(info, pdf_paths, progress)
+
+
+def _worker_loop():
+    while True:
+        job = _claim_next_job()
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        try:
+            _run_job(job)
+            _update(job["id"], status="done", progress=1.0, eta_seconds=0, finished_at=time.time())
+        except JobCancelled:
+            _update(job["id"], status="cancelled", message="Cancelled by user", finished_at=time.time())
+        except Exception as e:
+            print(f"❌ Job {job['id']} failed: {e}")
+            _update(job["id"], status="failed", message=repr(e), finished_at=time.time())
+
+        for fn in list(_listeners):
+            try:
+                fn(job)
+            except Exception as e:
+                print(f"⚠ Job listener failed: {e}")
+
+
+def add_listener(fn):
+    """
+    job 종료(성공 / 실패 / 취소) 시 fn(job) 호출 — 예: retriever reload.
+    """
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def start_worker(threads: int = WORKER_THREADS):
+    """
+    프로세스당 1번만 background worker thread 시작 (여러 번 호출해도 안전).
+    """
+    with _worker_lock:
+        if _workers:
+            return
+        _requeue_orphans()
+        for i in range(threads):
+            t = threading.Thread(target=_worker_loop, name=f"ingest-worker-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
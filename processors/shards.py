@@ -0,0 +1,260 @@
+"""
+시즌 / 발행본(issue)별 store shard + manifest.
+
+store 이름: <doc_type>[_<season>[_r<issue>]]_<text|tables>
+    sporting_2026_r20260228_text, technical_2025_tables, misc_text (시즌 미상 — 기존 이름 유지)
+
+output/chroma/manifest.json 에 shard별 시즌 / 발행본 / 원본 PDF / store 목록과
+doc_type별 현재(current) shard들을 기록. 검색 시에는 현재 shard만 조회하고,
+질문에 연도가 있으면 해당 시즌 shard를 조회.
+
+현재 shard는 (doc_type, 문서 계열)마다 최신 1개 — 본문과 날짜가 다른 appendix는
+서로 대체하지 않음. misc는 서로 관계없는 문서 모음이므로 대체 없이 전부 현재.
+"""
+import os
+import re
+import json
+import time
+import threading
+
+from processors.file_lock import file_lock
+from processors.store_swap import LIVE_DIR
+
+# -----------------------------------------------------------
+# 0. 설정
+# -----------------------------------------------------------
+MANIFEST_PATH = os.path.join(LIVE_DIR, "manifest.json")
+CURRENT_SEASON = os.getenv("RAG_CURRENT_SEASON")  # 지정 시 doc_type별 최신 시즌 대신 사용
+UNVERSIONED_DOC_TYPES = {"misc"}  # 발행본끼리 대체하지 않는 doc_type
+
+_MONTHS = {
+    m: i for i, m in enumerate(
+        ["january", "february", "march", "april", "may", "june", "july",
+         "august", "september", "october", "november", "december"], start=1)
+}
+_NUM_DATE = re.compile(r"(?<!\d)(20\d{2})[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])(?!\d)")
+_TEXT_DATE = re.compile(r"(?<!\d)(\d{1,2})\s+(" + "|".join(_MONTHS) + r")\s+(20\d{2})(?!\d)", re.I)
+_YEAR = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+_ISSUE = re.compile(r"(?<![a-z])issue[\s_-]*(\d{1,3})(?!\d)", re.I)
+
+_lock = threading.Lock()
+_cache = {"mtime": None, "manifest": None}
+_sniff_cache = {}
+
+
+# -----------------------------------------------------------
+# 1. 시즌 / 발행본 감지
+# -----------------------------------------------------------
+def parse_season_issue(text):
+    """
+    반환: (season, issue) — 못 찾으면 None
+
+    - issue : 발행일 YYYYMMDD (없으면 "Issue N"의 N)
+    - season: 발행일이 아닌 단독 연도 (2026 규정은 2025년에 발행되기도 함)
+    """
+    issue = None
+
+    m = _NUM_DATE.search(text)
+    if m:
+        issue = int("".join(m.groups()))
+        text = text[:m.start()] + " " + text[m.end():]
+    else:
+        m = _TEXT_DATE.search(text)
+        if m:
+            day, month, year = m.groups()
+            issue = int(f"{year}{_MONTHS[month.lower()]:02d}{int(day):02d}")
+            text = text[:m.start()] + " " + text[m.end():]
+
+    if issue is None:
+        m = _ISSUE.search(text)
+        if m:
+            issue = int(m.group(1))
+
+    m = _YEAR.search(text)
+    season = int(m.group(1)) if m else None
+    return season, issue
+
+
+def _first_page_text(pdf_path):
+    from langchain_community.document_loaders import PyPDFLoader
+
+    try:
+        page = next(PyPDFLoader(pdf_path).lazy_load(), None)
+    except Exception as e:
+        print(f"⚠ Failed to read first page of {pdf_path}: {e}")
+        return ""
+    return page.page_content[:2000] if page else ""
+
+
+def detect_shard(pdf_path, doc_type):
+    """
+    파일명 우선, 없으면 첫 페이지 표지에서 시즌 / 발행본 감지.
+    반환: {"shard", "doc_type", "season", "issue"}
+    """
+    key = (os.path.abspath(pdf_path), os.path.getmtime(pdf_path) if os.path.exists(pdf_path) else None)
+    if key not in _sniff_cache:
+        season, issue = parse_season_issue(os.path.basename(pdf_path))
+        if (season is None or issue is None) and os.path.exists(pdf_path):
+            t_season, t_issue = parse_season_issue(_first_page_text(pdf_path))
+            season = season if season is not None else t_season
+            issue = issue if issue is not None else t_issue
+        _sniff_cache[key] = (season, issue)
+
+    season, issue = _sniff_cache[key]
+    return {
+        "shard": shard_name(doc_type, season, issue),
+        "doc_type": doc_type,
+        "season": season,
+        "issue": issue,
+    }
+
+
+def source_family(filename):
+    """
+    문서 계열 — 파일명에서 날짜 / 발행본 / 연도 / 확장자를 뺀 나머지.
+        2026_F1_Sporting_Regulations_Issue_3.pdf → "f1 sporting regulations"
+        Appendix_7_2026-01-15.pdf               → "appendix 7"
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    for pattern in (_NUM_DATE, _TEXT_DATE, _ISSUE, _YEAR):
+        name = pattern.sub(" ", name)
+    return re.sub(r"[^0-9a-z]+", " ", name.lower()).strip()
+
+
+def shard_name(doc_type, season, issue):
+    if season is None:
+        return doc_type
+    if issue is None:
+        return f"{doc_type}_{season}"
+    return f"{doc_type}_{season}_r{issue}"
+
+
+# -----------------------------------------------------------
+# 2. Manifest
+# -----------------------------------------------------------
+def load_manifest():
+    """
+    파일이 바뀌었을 때만 다시 읽음.
+    """
+    mtime = os.path.getmtime(MANIFEST_PATH) if os.path.exists(MANIFEST_PATH) else None
+    with _lock:
+        if _cache["manifest"] is None or _cache["mtime"] != mtime:
+            if mtime is None:
+                _cache["manifest"] = {"shards": {}, "current": {}}
+            else:
+                with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                    _cache["manifest"] = json.load(f)
+            _cache["mtime"] = mtime
+        return _cache["manifest"]
+
+
+def _sort_key(info):
+    return (info.get("season") or 0, info.get("issue") or 0)
+
+
+def _families(info):
+    # 예전 manifest에는 "families"가 없음 → sources에서 계산
+    return info.get("families") or sorted({source_family(src) for src in info.get("sources", [])}) or [""]
+
+
+def _current_shards(shards, season=None):
+    """
+    {doc_type: [shard, ...]} — (doc_type, 문서 계열)별 최신 shard (season 지정 시 그 시즌 안에서).
+    UNVERSIONED_DOC_TYPES는 전부 포함.
+    """
+    best = {}
+    current = {}
+    for name, info in shards.items():
+        if season is not None and info.get("season") != season:
+            continue
+        if info["doc_type"] in UNVERSIONED_DOC_TYPES:
+            current.setdefault(info["doc_type"], set()).add(name)
+            continue
+        for family in _families(info):
+            key = (info["doc_type"], family)
+            if key not in best or _sort_key(info) > _sort_key(shards[best[key]]):
+                best[key] = name
+
+    for (doc_type, _), name in best.items():
+        current.setdefault(doc_type, set()).add(name)
+    return {doc_type: sorted(names) for doc_type, names in current.items()}
+
+
+def managed_stores():
+    """
+    manifest에 기록된 (shard 소속) store 이름 set.
+    """
+    return {s for info in load_manifest().get("shards", {}).values() for s in info["stores"]}
+
+
+def update_manifest(info, pdf_paths, stores):
+    """
+    shard 1개 빌드 후 호출. stores = 실제로 live 인 store 이름들.
+    """
+    # 다른 프로세스의 job worker도 같은 manifest를 고치므로 파일 lock으로 직렬화
+    with file_lock(MANIFEST_PATH):
+        manifest = {"shards": {}, "current": {}}
+        if os.path.exists(MANIFEST_PATH):
+            with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        shards = manifest.setdefault("shards", {})
+        if stores:
+            shards[info["shard"]] = {
+                "doc_type": info["doc_type"],
+                "season": info["season"],
+                "issue": info["issue"],
+                "sources": sorted(os.path.basename(p) for p in pdf_paths),
+                "families": sorted({source_family(p) for p in pdf_paths}),
+                "stores": sorted(stores),
+                "updated_at": time.time(),
+            }
+        else:
+            shards.pop(info["shard"], None)
+
+        manifest["current"] = _current_shards(shards)
+
+        os.makedirs(LIVE_DIR, exist_ok=True)
+        tmp = MANIFEST_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, MANIFEST_PATH)
+
+    print(f"✓ Manifest updated: {info['shard']} (current: {manifest['current']})")
+
+
+# -----------------------------------------------------------
+# 3. 검색 시 shard routing
+# -----------------------------------------------------------
+def select_stores(query, store_names):
+    """
+    검색할 store 이름 목록.
+
+    - 기본 → doc_type별 현재 shard들 (RAG_CURRENT_SEASON 지정 시 그 시즌)
+    - 질문에 연도(2025 등)가 있으면 → 그 시즌 shard가 있는 doc_type은 그 시즌 최신 발행본
+    - misc 등 UNVERSIONED_DOC_TYPES는 시즌과 관계없이 전부
+    - manifest에 없는 store (sharding 이전 빌드)는 같은 doc_type의 shard가 생기면 retire 됨 → 남아 있으면 포함
+    """
+    manifest = load_manifest()
+    shards = manifest.get("shards", {})
+    if not shards:
+        return list(store_names)
+
+    # manifest["current"]는 기록용 — 예전 형식일 수 있으므로 shards에서 다시 계산
+    selected = _current_shards(shards)
+    if CURRENT_SEASON:
+        selected.update(_in_season(shards, int(CURRENT_SEASON)))
+
+    for year in _YEAR.findall(query or ""):
+        selected.update(_in_season(shards, int(year)))
+
+    allowed = {s for names in selected.values() for name in names for s in shards[name]["stores"]}
+    managed = {s for info in shards.values() for s in info["stores"]}
+
+    return [s for s in store_names if s in allowed or s not in managed]
+
+
+def _in_season(shards, season):
+    # 해당 시즌 shard가 있는 doc_type만 교체 (UNVERSIONED_DOC_TYPES는 그대로 전부)
+    picked = _current_shards(shards, season)
+    return {doc_type: names for doc_type, names in picked.items() if doc_type not in UNVERSIONED_DOC_TYPES}
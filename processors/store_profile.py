@@ -0,0 +1,198 @@
+"""
+store / article cluster centroid profile + query router.
+
+- ingestion: build 디렉토리마다 profile.json 생성 (store 전체 centroid + article별 centroid)
+  → live symlink와 함께 교체되므로 store와 profile이 항상 같은 build를 가리킴
+- 검색: 이미 계산된 query embedding으로 store / article cluster 점수를 매겨
+  상위 N개 store (+ 상위 article)만 검색, 확신이 낮으면 전체 검색
+"""
+import os
+import json
+
+import numpy as np
+
+from langchain_chroma import Chroma
+
+from clients import get_embeddings
+
+# -----------------------------------------------------------
+# 0. 설정
+# -----------------------------------------------------------
+PROFILE_FILE = "profile.json"
+PAGE_SIZE = 1000
+MAX_CLUSTERS = int(os.getenv("RAG_ROUTER_MAX_CLUSTERS", "200"))
+
+TOP_STORES = int(os.getenv("RAG_ROUTER_TOP_STORES", "2"))
+TOP_CLUSTERS = int(os.getenv("RAG_ROUTER_TOP_CLUSTERS", "4"))
+MIN_SCORE = float(os.getenv("RAG_ROUTER_MIN_SCORE", "0.2"))  # 최고 점수가 이보다 낮으면 전체 검색
+MIN_MARGIN = float(os.getenv("RAG_ROUTER_MIN_MARGIN", "0.02"))  # 선택 / 탈락 store 점수 차
+CLUSTER_MIN_SCORE = float(os.getenv("RAG_ROUTER_CLUSTER_MIN_SCORE", "0.3"))  # 최고 cluster 점수가 이보다 낮으면 필터 없음
+CLUSTER_MIN_MARGIN = float(os.getenv("RAG_ROUTER_CLUSTER_MIN_MARGIN", "0.02"))  # 선택 / 탈락 cluster 점수 차
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# -----------------------------------------------------------
+# 1. Ingestion — profile 생성
+# -----------------------------------------------------------
+def build_profile(persist_dir):
+    """
+    build 디렉토리의 embedding을 읽어 profile.json 저장 (embedding 재계산 없음).
+
+    {"dim", "count",
+     "centroid": [...],
+     "clusters": [{"article": ..., "count": ..., "centroid": [...]}, ...],
+     "unclustered_articles": [...],   # cluster가 없는 article ("unknown", MAX_CLUSTERS 초과분)
+     "unlabeled": N}                  # article metadata가 없는 chunk 수
+    """
+    store = Chroma(persist_directory=persist_dir, embedding_function=get_embeddings())
+    collection = store._collection
+
+    vectors, articles = [], []
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=["embeddings", "metadatas"])
+        if not page["ids"]:
+            break
+        vectors.extend(page["embeddings"])
+        articles.extend((m or {}).get("article") for m in page["metadatas"])
+        offset += len(page["ids"])
+
+    if not vectors:
+        return None
+
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+
+    groups = {}
+    for i, article in enumerate(articles):
+        if article and article != "unknown":
+            groups.setdefault(article, []).append(i)
+
+    # 큰 article부터 MAX_CLUSTERS개
+    top_groups = sorted(groups.items(), key=lambda kv: -len(kv[1]))[:MAX_CLUSTERS]
+    clustered = {article for article, _ in top_groups}
+
+    profile = {
+        "dim": int(matrix.shape[1]),
+        "count": int(matrix.shape[0]),
+        "centroid": _normalize(matrix.mean(axis=0)).round(6).tolist(),
+        "clusters": [
+            {
+                "article": article,
+                "count": len(idx),
+                "centroid": _normalize(matrix[idx].mean(axis=0)).round(6).tolist(),
+            }
+            for article, idx in top_groups
+        ],
+        # article 필터를 걸어도 항상 검색되도록 (router가 필터에 추가)
+        "unclustered_articles": sorted({a for a in articles if a and a not in clustered}),
+        "unlabeled": sum(1 for a in articles if not a),
+    }
+
+    with open(os.path.join(persist_dir, PROFILE_FILE), "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False)
+
+    print(f"✓ Profile built: {persist_dir} ({profile['count']} chunks, {len(profile['clusters'])} clusters)")
+    return profile
+
+
+# -----------------------------------------------------------
+# 2. 검색 — profile 로드 / 라우팅
+# -----------------------------------------------------------
+def load_profile(persist_dir):
+    """
+    반환: {"dim", "centroid": ndarray, "articles": [...], "clusters": ndarray,
+           "unclustered_articles": [...], "unlabeled": N 또는 None} 또는 None
+    """
+    path = os.path.join(persist_dir, PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠ Failed to load profile {path}: {e}")
+        return None
+
+    clusters = raw.get("clusters", [])
+    return {
+        "dim": raw["dim"],
+        "centroid": np.asarray(raw["centroid"], dtype=np.float32),
+        "articles": [c["article"] for c in clusters],
+        "clusters": np.asarray([c["centroid"] for c in clusters], dtype=np.float32).reshape(-1, raw["dim"]),
+        "unclustered_articles": raw.get("unclustered_articles", []),
+        "unlabeled": raw.get("unlabeled"),  # 예전 profile은 None → 필터 안 함
+    }
+
+
+def _article_scope(profile, sims, order, top_clusters):
+    """
+    article 필터 대상 (None = 필터 없음).
+
+    - article이 top_clusters개 이하 → 필터 이득 없음
+    - 최고 cluster 점수 < CLUSTER_MIN_SCORE 이거나
+      선택 / 탈락 cluster 점수 차 < CLUSTER_MIN_MARGIN → 확신 낮음, 필터 없음
+    - article metadata가 없는 chunk가 있으면 필터로 포함시킬 수 없음 → 필터 없음
+    - cluster가 없는 article ("unknown", MAX_CLUSTERS 초과분)은 항상 필터에 포함
+    """
+    if len(order) <= top_clusters or profile["unlabeled"] is None or profile["unlabeled"] > 0:
+        return None
+    if sims[order[0]] < CLUSTER_MIN_SCORE:
+        return None
+    if sims[order[top_clusters - 1]] - sims[order[top_clusters]] < CLUSTER_MIN_MARGIN:
+        return None
+
+    chosen = [profile["articles"][i] for i in order[:top_clusters]]
+    return chosen + list(profile["unclustered_articles"])
+
+
+def route(query_vector, stores, top_stores: int = TOP_STORES, top_clusters: int = TOP_CLUSTERS):
+    """
+    stores = [(name, item), ...]  (item["profile"] = load_profile 결과)
+
+    반환: [(name, item, article 리스트 또는 None), ...]
+    - 점수 = max(store centroid 유사도, 최고 article cluster 유사도)
+    - profile 없는 store는 판단 불가 → 항상 포함 (article 필터 없음)
+    - 최고 점수 < MIN_SCORE 이거나 선택 / 탈락 점수 차 < MIN_MARGIN → 전체 검색
+    - article 필터는 cluster 점수에 확신이 있을 때만 (_article_scope)
+    """
+    q = _normalize(np.asarray(query_vector, dtype=np.float32))
+
+    scored, unprofiled = [], []
+    for name, item in stores:
+        profile = item.get("profile")
+        if profile is None or profile["dim"] != q.shape[0]:
+            unprofiled.append((name, item, None))
+            continue
+
+        store_score = float(profile["centroid"] @ q)
+        articles = None
+        if len(profile["articles"]):
+            sims = profile["clusters"] @ q
+            order = np.argsort(-sims)
+            store_score = max(store_score, float(sims[order[0]]))
+            articles = _article_scope(profile, sims, order, top_clusters)
+        scored.append((store_score, name, item, articles))
+
+    broad = [(name, item, None) for name, item in stores]
+    if not scored:
+        return broad
+
+    scored.sort(key=lambda s: -s[0])
+    chosen, rest = scored[:top_stores], scored[top_stores:]
+
+    if chosen[0][0] < MIN_SCORE:
+        return broad
+    if rest and chosen[-1][0] - rest[0][0] < MIN_MARGIN:
+        return broad
+
+    return [(name, item, articles) for _, name, item, articles in chosen] + unprofiled
+
+
+def article_filter(articles):
+    return {"article": {"$in": list(articles)}} if articles else None
@@ -0,0 +1,253 @@
+import os
+import time
+import shutil
+
+from langchain_chroma import Chroma
+
+from clients import get_embeddings
+
+# -----------------------------------------------------------
+# 0. 디렉토리 구조
+# -----------------------------------------------------------
+# output/chroma/<store>                  → symlink (live, retriever가 로드)
+# output/chroma_builds/<store>/<build>   → 실제 Chroma 디렉토리 (build별 1개)
+LIVE_DIR = "output/chroma"
+BUILDS_DIR = "output/chroma_builds"
+KEEP_BUILDS = int(os.getenv("RAG_KEEP_BUILDS", "2"))  # live + rollback 용 이전 build
+
+
+class StoreValidationError(Exception):
+    pass
+
+
+def live_path(name):
+    return os.path.join(LIVE_DIR, name)
+
+
+def new_staging_dir(name):
+    """
+    새 build 디렉토리 경로 (아직 live 아님).
+    """
+    build_id = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+    path = os.path.join(BUILDS_DIR, name, build_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def list_builds(name):
+    root = os.path.join(BUILDS_DIR, name)
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        os.path.realpath(os.path.join(root, b))
+        for b in os.listdir(root)
+        if not b.startswith(".")
+    )
+
+
+def current_build(name):
+    link = live_path(name)
+    if os.path.islink(link):
+        return os.path.realpath(link)
+    return None
+
+
+# -----------------------------------------------------------
+# 1. 검증 (chunk 수 / embedding 차원 / sample query)
+# -----------------------------------------------------------
+def validate_store(path, max_count, sample_count: int = 2):
+    """
+    저장된 chunk 중 sample_count개 (처음 / 마지막 …)를 자기 text로 검색 →
+    top hit가 그 chunk (같은 text 또는 같은 section)여야 통과.
+    """
+    store = Chroma(persist_directory=path, embedding_function=get_embeddings())
+    collection = store._collection
+
+    count = collection.count()
+    if count == 0 or count > max_count:
+        raise StoreValidationError(f"{path}: unexpected chunk count {count} (max {max_count})")
+
+    sample = collection.get(limit=1, include=["embeddings"])
+    dim = len(sample["embeddings"][0])
+    expected_dim = len(get_embeddings().embed_query("dimension check"))
+    if dim != expected_dim:
+        raise StoreValidationError(f"{path}: embedding dim {dim} != {expected_dim}")
+
+    # 입력 docs가 아니라 실제 저장된 chunk에서 sample (near-duplicate 제거 후 남은 것)
+    offsets = sorted({round(i * (count - 1) / max(1, sample_count - 1)) for i in range(sample_count)})
+    for offset in offsets:
+        chunk = collection.get(limit=1, offset=offset, include=["documents", "metadatas"])
+        text, metadata = chunk["documents"][0], chunk["metadatas"][0] or {}
+
+        hits = store.similarity_search(text, k=1)
+        if not hits:
+            raise StoreValidationError(f"{path}: sample query returned nothing")
+
+        top = hits[0]
+        section = metadata.get("section")
+        if top.page_content != text and not (section and top.metadata.get("section") == section):
+            raise StoreValidationError(
+                f"{path}: sample chunk #{offset} (section={section}) is not its own top hit "
+                f"(got section={top.metadata.get('section')})"
+            )
+
+    return {"count": count, "dim": dim}
+
+
+# -----------------------------------------------------------
+# 2. Promote (atomic symlink 교체) / Rollback / Retire
+# -----------------------------------------------------------
+def _archive_legacy_dir(name):
+    # 예전 방식(실제 디렉토리)으로 만들어진 store는 build 디렉토리로 이동해서 보존
+    link = live_path(name)
+    if os.path.isdir(link) and not os.path.islink(link):
+        # 이름이 가장 앞에 정렬되도록 → 가장 오래된 build 취급
+        legacy = os.path.join(BUILDS_DIR, name, "00000000-000000-legacy-" + time.strftime("%Y%m%d%H%M%S"))
+        os.makedirs(os.path.dirname(legacy), exist_ok=True)
+        os.rename(link, legacy)
+
+
+def _point_live_to(name, build_path):
+    os.makedirs(LIVE_DIR, exist_ok=True)
+    link = live_path(name)
+
+    _archive_legacy_dir(name)
+
+    # 임시 link 생성 후 os.replace → 읽는 쪽은 항상 이전 / 새 build 중 하나만 봄
+    tmp_link = os.path.join(LIVE_DIR, f".{name}.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.abspath(build_path), tmp_link)
+    os.replace(tmp_link, link)
+
+
+def promote(name, build_path):
+    _point_live_to(name, build_path)
+    prune(name)
+    print(f"✓ Promoted {name} → {build_path}")
+
+
+def rollback(name):
+    """
+    live build 바로 이전 build로 되돌림.
+    """
+    builds = list_builds(name)
+    current = current_build(name)
+    if current not in builds or builds.index(current) == 0:
+        raise ValueError(f"No previous build to roll back to for {name}")
+
+    previous = builds[builds.index(current) - 1]
+    _point_live_to(name, previous)
+    print(f"↩ Rolled back {name} → {previous}")
+    return previous
+
+
+def retire(name):
+    """
+    새 build 결과가 비어 있거나 store가 더 이상 쓰이지 않을 때 live link만 제거
+    (build는 rollback용으로 남김, 예전 방식 디렉토리는 build 디렉토리로 이동).
+    """
+    _archive_legacy_dir(name)
+    link = live_path(name)
+    if os.path.islink(link):
+        os.remove(link)
+        print(f"✓ Retired live store {name}")
+
+
+def prune(name, keep: int = KEEP_BUILDS):
+    """
+    live build 포함 최근 keep개만 남기고 오래된 build 삭제.
+    다른 프로세스가 아직 열고 있는 build (reader lease)는 남겨 두고,
+    마지막 reader가 release_reader 할 때 다시 prune.
+    """
+    builds = list_builds(name)
+    current = current_build(name)
+
+    survivors = set(builds[-keep:]) | active_readers(name)
+    if current:
+        survivors.add(current)
+
+    for path in builds:
+        if path not in survivors:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def discard(build_path):
+    shutil.rmtree(build_path, ignore_errors=True)
+
+
+# -----------------------------------------------------------
+# 3. Reader lease — 프로세스가 열고 있는 build 표시
+# -----------------------------------------------------------
+# output/chroma_builds/<store>/.readers/<build>.<pid>
+# (list_builds는 "."으로 시작하는 항목을 건너뛰므로 build로 취급되지 않음)
+READERS_DIR = ".readers"
+
+
+def _build_of(path):
+    # build 경로 → (store, build id). BUILDS_DIR 밖 (예전 방식 디렉토리)이면 None
+    rel = os.path.relpath(os.path.realpath(path), os.path.realpath(BUILDS_DIR))
+    parts = rel.split(os.sep)
+    if rel.startswith("..") or len(parts) != 2:
+        return None
+    return parts[0], parts[1]
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def acquire_reader(build_path):
+    """
+    이 프로세스가 build_path를 열었음을 기록 → prune 대상에서 제외.
+    """
+    owner = _build_of(build_path)
+    if owner is None:
+        return
+    name, build_id = owner
+    lease_dir = os.path.join(BUILDS_DIR, name, READERS_DIR)
+    os.makedirs(lease_dir, exist_ok=True)
+    with open(os.path.join(lease_dir, f"{build_id}.{os.getpid()}"), "w"):
+        pass
+
+
+def release_reader(build_path):
+    """
+    build_path를 더 이상 읽지 않음 → lease 제거 후 정리 가능한 build prune.
+    """
+    owner = _build_of(build_path)
+    if owner is None:
+        return
+    name, build_id = owner
+    try:
+        os.remove(os.path.join(BUILDS_DIR, name, READERS_DIR, f"{build_id}.{os.getpid()}"))
+    except FileNotFoundError:
+        pass
+    prune(name)
+
+
+def active_readers(name):
+    """
+    살아 있는 프로세스가 열고 있는 build 경로 set (죽은 프로세스의 lease는 삭제).
+    """
+    lease_dir = os.path.join(BUILDS_DIR, name, READERS_DIR)
+    if not os.path.isdir(lease_dir):
+        return set()
+
+    in_use = set()
+    for lease in os.listdir(lease_dir):
+        build_id, _, pid = lease.rpartition(".")
+        if pid.isdigit() and _pid_alive(int(pid)):
+            in_use.add(os.path.realpath(os.path.join(BUILDS_DIR, name, build_id)))
+        else:
+            try:
+                os.remove(os.path.join(lease_dir, lease))
+            except FileNotFoundError:
+                pass
+    return in_use
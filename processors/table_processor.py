@@ -3,9 +3,12 @@ import json
 import camelot
 
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 
+from clients import get_embeddings
+from processors.fingerprint import collapse_near_duplicates
+from processors.text_processor import add_documents_in_batches
+
 
 # -----------------------------------------------------------
 # 1. PDF에서 표 추출 (Camelot)
@@ -76,7 +79,7 @@ def convert_tables_to_documents(tables):
 # -----------------------------------------------------------
 # 3. Chroma VectorStore 저장
 # -----------------------------------------------------------
-def save_table_vectorstore(docs, persist_dir="output/chroma/f1_tables"):
+def save_table_vectorstore(docs, persist_dir="output/chroma/f1_tables", progress=None):
     print("Saving table vectorstore...")
 
     # 🔥 문서가 0개면 Chroma 생성하면 안됨
@@ -84,14 +87,17 @@ def save_table_vectorstore(docs, persist_dir="output/chroma/f1_tables"):
         print("⚠ No table docs found. Skipping table vectorstore creation.")
         return None
 
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+    embeddings = get_embeddings()
     os.makedirs(persist_dir, exist_ok=True)
 
-    vectorstore = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_dir
-    )
+    # 🔥 같은 표가 여러 PDF에 있으면 한 번만 저장 (내용이 완전히 같을 때만)
+    docs = collapse_near_duplicates(docs)
+    if len(docs) == 0:
+        print("⚠ All tables already stored. Skipping.")
+        return None
+
+    vectorstore = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    add_documents_in_batches(vectorstore, docs, progress)
 
     print("✓ Table vectorstore created.")
     return vectorstore
@@ -1,12 +1,14 @@
-import re
 import os
 
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 
+from clients import get_embeddings
+from processors.fingerprint import collapse_near_duplicates
+from processors.grammars import GRAMMARS, combine_pages, split_articles, split_sections
+
 
 # -----------------------------------------------------------
 # 1. PDF 로드
@@ -19,61 +21,23 @@ def load_pdf(path):
 # -----------------------------------------------------------
 # 2. ARTICLE split
 # -----------------------------------------------------------
-def split_by_article(pages):
-    combined = "".join(p.page_content + "\n" for p in pages)
-
-    pattern = r"(ARTICLE\s+B\d+(?::)?[^\n]*)"
-    parts = re.split(pattern, combined)
-
-    article_chunks = []
-
-    for i in range(1, len(parts), 2):
-        title = parts[i].strip()
-        body = parts[i + 1].strip()
-
-        # 🔥 body가 충분히 길지 않으면 skip
-        if len(body) < 15:
-            continue
-
-        article_chunks.append((title, body))
-
-    return article_chunks
+def split_by_article(pages, grammar=None):
+    """
+    반환: [(제목, 본문), ...]
+    grammar 기본값은 Sporting (ARTICLE B..) — 다른 family는 processors.grammars 참고.
+    """
+    text, _, _ = combine_pages(pages)
+    return [
+        (title, body)
+        for title, body, _ in split_articles(text, grammar or GRAMMARS["sporting"])
+    ]
 
 
 # -----------------------------------------------------------
 # 3. SECTION split
 # -----------------------------------------------------------
-def split_into_sections(article_title, body_text):
-    pattern = r"\b(B\d+(?:\.\d+)+)\b"
-    parts = re.split(pattern, body_text)
-
-    sections = []
-
-    intro = parts[0].strip()
-    if len(intro) > 5:
-        sections.append(
-            Document(
-                page_content=intro,
-                metadata={"article": article_title, "section": "intro"}
-            )
-        )
-
-    for i in range(1, len(parts), 2):
-        section_id = parts[i].strip()
-        text = parts[i + 1].strip()
-
-        # 🔥 내용이 너무 짧으면 skip
-        if len(text) < 5:
-            continue
-
-        sections.append(
-            Document(
-                page_content=text,
-                metadata={"article": article_title, "section": section_id}
-            )
-        )
-
-    return sections
+def split_into_sections(article_title, body_text, grammar=None):
+    return split_sections(article_title, body_text, grammar or GRAMMARS["sporting"])
 
 
 # -----------------------------------------------------------
@@ -107,11 +71,7 @@ def chunk_optimize(sections, max_chars: int = 1000, overlap: int = 200):
             optimized_chunks.append(
                 Document(
                     page_content=text,
-                    metadata={
-                        "article": sec.metadata.get("article"),
-                        "section": sec.metadata.get("section"),
-                        "subchunk_index": 0,
-                    },
+                    metadata={**sec.metadata, "subchunk_index": 0},
                 )
             )
             continue
@@ -127,11 +87,7 @@ def chunk_optimize(sections, max_chars: int = 1000, overlap: int = 200):
             optimized_chunks.append(
                 Document(
                     page_content=chunk,
-                    metadata={
-                        "article": sec.metadata.get("article"),
-                        "section": sec.metadata.get("section"),
-                        "subchunk_index": i,
-                    },
+                    metadata={**sec.metadata, "subchunk_index": i},
                 )
             )
 
@@ -142,8 +98,23 @@ def chunk_optimize(sections, max_chars: int = 1000, overlap: int = 200):
 # -----------------------------------------------------------
 # 5. Chroma 저장
 # -----------------------------------------------------------
-def save_vectorstore(chunks, persist_dir):
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+EMBED_BATCH_SIZE = 64
+
+
+def add_documents_in_batches(store, docs, progress=None, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    embedding을 batch 단위로 나눠 저장 → batch마다 progress(fraction) 보고.
+    """
+    total = len(docs)
+    for start in range(0, total, batch_size):
+        store.add_documents(docs[start:start + batch_size])
+        if progress:
+            progress(min(start + batch_size, total) / total)
+    return store
+
+
+def save_vectorstore(chunks, persist_dir, progress=None):
+    embeddings = get_embeddings()
     os.makedirs(persist_dir, exist_ok=True)
 
     # ⭐ 최종 필터링 (100% 보호)
@@ -155,11 +126,19 @@ def save_vectorstore(chunks, persist_dir):
     if len(clean_chunks) == 0:
         raise ValueError(f"No valid chunks found to embed for {persist_dir}")
 
-    return Chroma.from_documents(
-        documents=clean_chunks,
-        embedding=embeddings,
-        persist_directory=persist_dir
-    )
+    # ⭐ near-duplicate 제거 (같은 section / 같은 숫자인 chunk끼리만)
+    before = len(clean_chunks)
+    clean_chunks = collapse_near_duplicates(clean_chunks)
+    print(f"Near-duplicate chunks collapsed: {before - len(clean_chunks)}")
+
+    if len(clean_chunks) == 0:
+        print(f"⚠ All chunks already stored in {persist_dir}. Skipping.")
+        return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+    store = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    return add_documents_in_batches(store, clean_chunks, progress)
+
+
 def fallback_chunking(pages):
     """
     ARTICLE 패턴이 전혀 없는 규정 문서를 위한 fallback chunking
@@ -0,0 +1,131 @@
+import os
+import re
+import math
+import time
+import hashlib
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# ---------------------------------------
+# 0. Provider 설정
+# ---------------------------------------
+# RAG_PROVIDER
+#   - "openai" : OpenAI API (OPENAI_BASE_URL로 openai_stub_server 지정 가능)
+#   - "local"  : 네트워크 없이 동작하는 결정적(deterministic) stub
+PROVIDER = os.getenv("RAG_PROVIDER", "openai").lower()
+
+LOCAL_EMBEDDING_DIM = int(os.getenv("RAG_LOCAL_EMBEDDING_DIM", "256"))
+LOCAL_EMBED_LATENCY_MS = float(os.getenv("RAG_LOCAL_EMBED_LATENCY_MS", "0"))
+LOCAL_LLM_LATENCY_MS = float(os.getenv("RAG_LOCAL_LLM_LATENCY_MS", "0"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+# ---------------------------------------
+# 1. 결정적 embedding / completion 함수 (stub server 공용)
+# ---------------------------------------
+def local_embed(text: str, dim: int = LOCAL_EMBEDDING_DIM) -> List[float]:
+    """
+    단어 + 단어 bigram feature hashing → L2 정규화 벡터.
+    같은 입력이면 항상 같은 벡터, 단어가 겹칠수록 cosine 유사도가 높음.
+    """
+    vec = [0.0] * dim
+    words = _WORD.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    for feat in features:
+        h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "big")
+        sign = 1.0 if (h >> 63) & 1 else -1.0
+        vec[h % dim] += sign
+
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _section_after(prompt: str, marker: str) -> Optional[str]:
+    idx = prompt.find(marker)
+    if idx < 0:
+        return None
+    return prompt[idx + len(marker):].strip()
+
+
+def local_complete(prompt: str) -> str:
+    """
+    프롬프트 형태에 따라 결정적으로 응답.
+
+    - RAG 프롬프트 ([Context]) → Context 첫 문장 반환
+    - 번역 프롬프트 (Query: / 텍스트:) → 원문 그대로 반환
+    - 그 외 → 프롬프트 마지막 줄 반환
+    """
+    context = _section_after(prompt, "[Context]")
+    if context is not None:
+        context = context.split("[Question]")[0].strip()
+        first = re.split(r"(?<=[.!?])\s", context, maxsplit=1)[0]
+        return first[:400]
+
+    for marker in ("Query:", "텍스트:"):
+        text = _section_after(prompt, marker)
+        if text is not None:
+            return text
+
+    lines = [ln for ln in prompt.strip().splitlines() if ln.strip()]
+    return lines[-1] if lines else ""
+
+
+def estimate_usage(prompt: str, completion: str):
+    # stub용 근사치 (4글자 ≈ 1토큰)
+    input_tokens = len(prompt) // 4 + 1
+    output_tokens = len(completion) // 4 + 1
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+# ---------------------------------------
+# 2. LangChain 호환 Local Embeddings
+# ---------------------------------------
+class LocalHashEmbeddings(Embeddings):
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM, latency_ms: float = LOCAL_EMBED_LATENCY_MS):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _sleep(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self._sleep()  # batch 1회 = API 호출 1회
+        return [local_embed(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self._sleep()
+        return local_embed(text, self.dim)
+
+
+# ---------------------------------------
+# 3. LangChain 호환 Local Chat Model
+# ---------------------------------------
+class LocalChatModel(BaseChatModel):
+    model: str = "local-echo"
+    latency_ms: float = LOCAL_LLM_LATENCY_MS
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-echo"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        prompt = "\n".join(str(m.content) for m in messages)
+        text = local_complete(prompt)
+
+        message = AIMessage(content=text, usage_metadata=estimate_usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -1,21 +1,71 @@
+import os
 import json
-from langchain_openai import ChatOpenAI
+from clients import MAX_RETRIES, get_chat_model
 from retriever import retrieve_across_all
+from context_packer import pack_context
+from processors.fingerprint import NearDuplicateIndex, doc_fingerprint, doc_guard, guard_key, simhash
+from processors.glossary import expand_query
+from singleflight import SingleFlight, normalize_query
+from stage_graph import run_stage_graph
+from tracing import span, incr, record_tokens, trace_request
+
+# stage별 timeout (초)
+TRANSLATE_TIMEOUT = float(os.getenv("RAG_TRANSLATE_TIMEOUT", "20"))
+RETRIEVE_TIMEOUT = float(os.getenv("RAG_RETRIEVE_TIMEOUT", "15"))
+
+# 검색어 번역 LLM 호출 1회 timeout — 재시도까지 합쳐도 stage timeout 안에 끝나도록
+TRANSLATE_CALL_TIMEOUT = TRANSLATE_TIMEOUT / (MAX_RETRIES + 1)
+
+
+class RetrievalUnavailable(RuntimeError):
+    """
+    검색 stage가 모두 실패 (timeout / 오류) — 빈 결과를 "문서 없음"으로 답하지 않도록.
+    """
+
+
+# 동시에 들어온 같은 질문은 파이프라인 1번만 실행
+ASK_FLIGHT = SingleFlight("ask_question", timeout=float(os.getenv("RAG_ASK_SINGLEFLIGHT_TIMEOUT", "120")))
 
 # ==========================================================
 #  Translator (KOR ↔ ENG)
 # ==========================================================
-translator = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+def get_translator():
+    return get_chat_model("gpt-4o-mini", temperature=0)
 
-def translate_to_english(query):
-    prompt = f"""
+def invoke_llm(llm, prompt, stage):
+    # stage별 latency + token 수 기록
+    with span(stage):
+        response = llm.invoke(prompt)
+    record_tokens(stage, getattr(response, "usage_metadata", None))
+    return response.content.strip()
+
+def english_prompt(query):
+    return f"""
 Translate this into FIA Sporting Regulations style English.
 Do NOT simplify terms. Maintain technical vocabulary.
 
 Query:
 {query}
 """
-    return translator.invoke(prompt).content.strip()
+
+def translate_to_english(query):
+    # query_en stage 안에서 호출 → stage timeout보다 짧은 client timeout
+    llm = get_chat_model("gpt-4o-mini", temperature=0, timeout=TRANSLATE_CALL_TIMEOUT)
+    return invoke_llm(llm, english_prompt(query), "translate_en")
+
+def to_search_query(query):
+    """
+    검색용 영문 query.
+    영어 질문은 그대로, 용어집으로 대부분 덮이는 한국어 질문은 원문 + 영문 용어
+    (LLM 호출 없음), 그 외에만 LLM 번역.
+    """
+    with span("glossary_expand"):
+        expanded = expand_query(query)
+    if expanded:
+        incr("glossary_hits")
+        return expanded
+    incr("glossary_misses")
+    return translate_to_english(query)
 
 def translate_to_korean(text):
     prompt = f"""
@@ -25,42 +75,17 @@ def translate_to_korean(text):
 텍스트:
 {text}
 """
-    return translator.invoke(prompt).content.strip()
+    return invoke_llm(get_translator(), prompt, "translate_ko")
 
 
 # ==========================================================
 #  중복 제거 로직 (store가 달라도 같은 chunk는 제거)
 # ==========================================================
 def dedupe_docs(docs):
-    seen = set()
-    unique = []
-    for d in docs:
-        sig = d.page_content.strip()[:200]   # 앞 200자 기준 signature
-        if sig not in seen:
-            seen.add(sig)
-            unique.append(d)
-    return unique
-
-
-# ==========================================================
-#  Relevance Scoring (Text only)
-# ==========================================================
-def relevance_score(doc, query):
-    if doc.metadata.get("type") == "table":
-        return 0
-    text = doc.page_content.lower()
-    q_words = query.lower().split()
-    return sum(1 for w in q_words if w in text)
-
-
-# ==========================================================
-#  Table Parsing
-# ==========================================================
-def parse_table_json(doc):
-    try:
-        return json.loads(doc.page_content)
-    except:
-        return None
+    # ingestion 때 저장된 simhash 기준 near-duplicate 제거 (O(1) band 조회)
+    # 같은 section + 같은 숫자일 때만 합침 (guard_key)
+    index = NearDuplicateIndex()
+    return [d for d in docs if index.add_if_new(doc_fingerprint(d), doc_guard(d))]
 
 
 # ==========================================================
@@ -102,61 +127,125 @@ def format_output(main_answer, regulation_blocks):
 
 
 # ==========================================================
-#                     MAIN RAG Q&A
+#  구조화된 결과 (UI / API 공용)
 # ==========================================================
-def ask_question(query: str, k: int = 8):
+def build_result(answer, citations, docs, query_en=None, grounded=True, degraded=None):
+    """
+    answer_question 결과 dict.
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    - answer    : 최종 한국어 답변
+    - citations : [{"text": ..., "citation": ...}, ...]
+    - docs      : 실제로 Context에 들어간 Document 리스트 (Evidence 패널용)
+    - html      : format_output 렌더링 결과 (기존 ask_question 반환값)
+    - degraded  : fallback으로 대체된 stage 이름 리스트 (검색 일부 실패 등)
+    """
+    return {
+        "answer": answer,
+        "citations": citations,
+        "docs": docs,
+        "query_en": query_en,
+        "grounded": grounded,
+        "degraded": degraded or [],
+        "html": format_output(answer, citations),
+    }
 
-    # ------------------------------------------------------
-    #  1) Query EN 변환
-    # ------------------------------------------------------
-    query_en = translate_to_english(query)
 
-    # ------------------------------------------------------
-    #  2) 한국어 + 영어 검색 → 결과 병합 후 중복 제거
-    # ------------------------------------------------------
-    docs_ko = retrieve_across_all(query, k=k)
-    docs_en = retrieve_across_all(query_en, k=k)
+# ==========================================================
+#                     MAIN RAG Q&A
+# ==========================================================
+def answer_question(query: str, k: int = 8):
+    """
+    질문 1개당 검색 1회 → 답변 + 사용된 Context 문서 + 인용을 함께 반환.
+    result["trace"]에 stage별 소요 시간 / token 수가 담김.
 
-    docs = dedupe_docs(docs_ko + docs_en)
+    같은 질문(정규화 기준)이 동시에 들어오면 먼저 시작된 계산 결과를 공유
+    (trace도 그 계산의 trace).
+    """
+    return ASK_FLIGHT.do((normalize_query(query), k), _traced_answer, query, k)
+
+
+def _traced_answer(query: str, k: int):
+    with trace_request() as spans, span("ask_question"):
+        result = _answer_question(query, k)
+    result["trace"] = spans
+    return result
 
-    if not docs:
-        return format_output("검색된 문서가 없습니다.", [])
 
+def _answer_question(query: str, k: int):
     # ------------------------------------------------------
-    #  3) 문서 분리
+    #  1~2) 한국어 검색 ∥ (EN 검색어 생성 → 영어 검색) 동시 실행
+    #       → 결과 병합 후 중복 제거
     # ------------------------------------------------------
-    text_docs = [d for d in docs if d.metadata.get("type") != "table"]
-    table_docs = [d for d in docs if d.metadata.get("type") == "table"]
+    stages = {
+        "docs_ko": {
+            "fn": lambda: retrieve_across_all(query, k=k),
+            "timeout": RETRIEVE_TIMEOUT,
+            "fallback": [],
+        },
+        "query_en": {
+            "fn": lambda: to_search_query(query),
+            "timeout": TRANSLATE_TIMEOUT,
+            "fallback": query,  # 번역 실패 시 원문으로 검색
+        },
+        "docs_en": {
+            "fn": lambda query_en: retrieve_across_all(query_en, k=k),
+            "deps": ["query_en"],
+            "timeout": RETRIEVE_TIMEOUT,
+            "fallback": [],
+        },
+    }
+    results = run_stage_graph(stages)
+
+    # 검색이 모두 실패하면 빈 결과로 답하지 않고 오류 (server.py → 503)
+    if {"docs_ko", "docs_en"} <= set(results.failed):
+        raise RetrievalUnavailable(f"retrieval failed: {results.failed}")
+
+    query_en = results["query_en"]
+    docs = dedupe_docs(results["docs_ko"] + results["docs_en"])
+
+    result = answer_from_docs(query, query_en, docs)
+    result["degraded"] = sorted(results.failed)
+    return result
+
+
+def answer_from_docs(query: str, query_en: str, docs):
+    """
+    검색이 끝난 문서로 Context 구성 → 답변 생성 → 인용 정리.
+    (ask_question / batch_ask 공용)
+    """
+    llm = get_chat_model("gpt-4o", temperature=0)
 
-    # relevance sorting
-    text_docs = sorted(text_docs, key=lambda d: relevance_score(d, query_en), reverse=True)
-    text_docs = text_docs[:3]
-    table_docs = table_docs[:2]
+    if not docs:
+        return build_result("검색된 문서가 없습니다.", [], [], query_en, grounded=False)
 
     # ------------------------------------------------------
-    #  4) Context 구성
+    #  3~4) Token budget 안에서 Context 구성 (MMR 다양성 선택)
     # ------------------------------------------------------
+    with span("pack_context"):
+        packed = pack_context(docs, query_en)
+
     context_blocks = []
+    context_docs = []
     citation_raw = []
+    citation_keys = []  # (simhash, guard_key) — 인용 중복 제거용
 
-    for d in text_docs:
-        context_blocks.append(d.page_content)
+    for item in packed:
+        d = item["doc"]
+        context_blocks.append(item["block"])
+        context_docs.append(d)
+
+        if item["table"] is not None:
+            # Python repr 대신 compact JSON (관련 행만 남긴 표)
+            cite_text = json.dumps(item["table"], ensure_ascii=False, separators=(",", ":"))
+        else:
+            cite_text = d.page_content[:300].replace("\n", " ")
+
+        citation_keys.append((simhash(cite_text), guard_key(cite_text, d.metadata)))
         citation_raw.append({
-            "text": d.page_content[:300].replace("\n", " "),
+            "text": cite_text,
             "citation": f"{d.metadata.get('source_store')} · p.{d.metadata.get('page')}"
         })
 
-    for d in table_docs:
-        table_data = parse_table_json(d)
-        if table_data:
-            context_blocks.append("TABLE_DATA:\n" + json.dumps(table_data, indent=2))
-            citation_raw.append({
-                "text": str(table_data),
-                "citation": f"{d.metadata.get('source_store')} · p.{d.metadata.get('page')}"
-            })
-
     context = "\n\n".join(context_blocks)
 
     # ------------------------------------------------------
@@ -180,10 +269,10 @@ Question:
 
 Answer:
 """
-        raw = llm.invoke(prompt).content.strip()
+        raw = invoke_llm(llm, prompt, "generate_fallback")
         answer_ko = translate_to_korean(raw)
 
-        return format_output(answer_ko, [])
+        return build_result(answer_ko, [], [], query_en, grounded=False)
 
     # ------------------------------------------------------
     #  7) 문서 기반 RAG 답변
@@ -202,18 +291,20 @@ If sentences are duplicated in Context, summarize them once.
 
 [Answer]
 """
-    raw_answer_en = llm.invoke(prompt).content.strip()
+    raw_answer_en = invoke_llm(llm, prompt, "generate")
     answer_ko = translate_to_korean(raw_answer_en)
 
     # ------------------------------------------------------
     #  8) 규정 인용 (중복 제거)
     # ------------------------------------------------------
-    seen = set()
-    reg_blocks = []
-    for c in citation_raw:
-        key = c["text"][:150]
-        if key not in seen:
-            seen.add(key)
-            reg_blocks.append(c)
-
-    return format_output(answer_ko, reg_blocks)
+    seen = NearDuplicateIndex()
+    reg_blocks = [c for c, (fp, guard) in zip(citation_raw, citation_keys) if seen.add_if_new(fp, guard)]
+
+    return build_result(answer_ko, reg_blocks, context_docs, query_en)
+
+
+def ask_question(query: str, k: int = 8):
+    """
+    기존 인터페이스 유지용 — 렌더링된 HTML만 반환.
+    """
+    return answer_question(query, k)["html"]
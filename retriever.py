@@ -1,49 +1,142 @@
 import os
+import time
+import threading
 from typing import List
 
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.retrievers import BaseRetriever
 
+from clients import get_embeddings
+from processors.glossary import match_terms, term_stores
+from processors.shards import select_stores
+from processors.store_swap import LIVE_DIR, acquire_reader, release_reader
+from processors.store_profile import article_filter, load_profile, route
+from singleflight import SingleFlight, normalize_query
+from tracing import span, incr
+
 # ---------------------------------------
 # 0. Embeddings (전역 1개만 사용)
 # ---------------------------------------
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+embeddings = get_embeddings()
 
 # ---------------------------------------
 # 1. VECTORSTORE 관리 (자동 로드)
 # ---------------------------------------
 VECTORSTORES = {}
+STORE_VERSION = 0  # reload 할 때마다 증가 → UI cache key로 사용
+
+# 다른 프로세스(다른 uvicorn worker / Streamlit worker)가 promote 한 build를
+# 검색 전에 감지하기 위한 상태 — live symlink 목록 + 가리키는 build
+RELOAD_CHECK_INTERVAL = float(os.getenv("RAG_RELOAD_CHECK_INTERVAL", "2"))  # 초
+_LOADED_SIGNATURE = None
+_OPEN_BUILDS = set()
+_last_check = 0.0
+_reload_lock = threading.Lock()
+_PINNED = False  # use_vectorstores()로 주입된 store → live reload로 덮어쓰지 않음
+
+
+def _live_signature():
+    if not os.path.exists(LIVE_DIR):
+        return ()
+    return tuple(sorted(
+        (folder, os.path.realpath(os.path.join(LIVE_DIR, folder)))
+        for folder in os.listdir(LIVE_DIR)
+        if not folder.startswith(".") and os.path.isdir(os.path.join(LIVE_DIR, folder))
+    ))
+
 
 def load_vectorstores():
     """
     output/chroma 폴더의 모든 vectorstore를 자동 로드하여
     VECTORSTORES dict에 저장.
+
+    새 dict를 다 만든 뒤 한 번에 교체하므로, 검색 중인 thread는
+    reload 도중에도 이전 dict를 그대로 사용.
     """
-    base_dir = "output/chroma"
+    with _reload_lock:
+        _load_vectorstores()
+
 
-    if not os.path.exists(base_dir):
+def _load_vectorstores():
+    global VECTORSTORES, STORE_VERSION, _LOADED_SIGNATURE, _OPEN_BUILDS
+    stores = {}
+    signature = _live_signature()
+
+    if not os.path.exists(LIVE_DIR):
         print("No vectorstores directory found.")
-        return
 
-    for folder in os.listdir(base_dir):
-        vs_path = os.path.join(base_dir, folder)
+    for folder, real_path in signature:
+        vs_path = os.path.join(LIVE_DIR, folder)
+        try:
+            # live store는 build 디렉토리를 가리키는 symlink →
+            # 실제 경로로 열어야 promote 후 reload 시 새 build를 읽음
+            # (열기 전에 lease → 다른 프로세스의 prune이 지우지 않음)
+            acquire_reader(real_path)
+            vs = Chroma(
+                persist_directory=real_path,
+                embedding_function=embeddings
+            )
+            stores[folder] = {
+                "name": folder,
+                "path": vs_path,
+                "vs": vs,
+                "profile": load_profile(real_path),  # 없으면 None (router가 항상 포함)
+            }
+            print(f"Loaded VectorStore: {folder}")
+        except Exception as e:
+            print(f"Failed to load VectorStore {folder}: {e}")
 
-        if os.path.isdir(vs_path):
-            try:
-                vs = Chroma(
-                    persist_directory=vs_path,
-                    embedding_function=embeddings
-                )
-                VECTORSTORES[folder] = {
-                    "name": folder,
-                    "path": vs_path,
-                    "vs": vs,
-                }
-                print(f"Loaded VectorStore: {folder}")
-            except Exception as e:
-                print(f"Failed to load VectorStore {folder}: {e}")
+    opened = {real_path for _, real_path in signature}
+    previous, _OPEN_BUILDS = _OPEN_BUILDS, opened
+
+    VECTORSTORES = stores
+    STORE_VERSION += 1
+    _LOADED_SIGNATURE = signature
+
+    # 더 이상 읽지 않는 build의 lease 해제 (마지막 reader면 그때 prune)
+    for real_path in previous - opened:
+        try:
+            release_reader(real_path)
+        except OSError as e:
+            print(f"⚠ Failed to release build {real_path}: {e}")
+
+
+def refresh_if_changed():
+    """
+    live symlink가 가리키는 build가 로드한 것과 다르면 reload.
+    (다른 프로세스에서 빌드 / promote / rollback 된 경우) — RELOAD_CHECK_INTERVAL마다 1번만 확인.
+    """
+    global _last_check
+    if _PINNED:
+        return False
+    now = time.monotonic()
+    if now - _last_check < RELOAD_CHECK_INTERVAL:
+        return False
+    _last_check = now
+
+    if _live_signature() == _LOADED_SIGNATURE:
+        return False
+
+    with _reload_lock:
+        # lock 대기 중 다른 thread가 이미 reload 했을 수 있음
+        if _live_signature() == _LOADED_SIGNATURE:
+            return False
+        print("Live vectorstore builds changed — reloading")
+        _load_vectorstores()
+    return True
+
+
+def use_vectorstores(stores):
+    """
+    live build 대신 주어진 store를 검색 대상으로 고정 (benchmark 등).
+    stores: {name: {"name", "path", "vs", "profile"}} — VECTORSTORES와 같은 형태.
+    """
+    global VECTORSTORES, STORE_VERSION, _PINNED
+    with _reload_lock:
+        VECTORSTORES = stores
+        STORE_VERSION += 1
+        _PINNED = True
 
 
 # 앱 실행 시 자동 로드
@@ -54,6 +147,14 @@ load_vectorstores()
 # 2. Query Routing
 # ---------------------------------------
 def route_query(query: str) -> str:
+    # 1) glossary 용어가 주로 등장한 store 종류 (ingestion 때 집계)
+    counts = term_stores(match_terms(query))
+    table_hits = sum(n for name, n in counts.items() if "tables" in name)
+    text_hits = sum(n for name, n in counts.items() if "text" in name)
+    if table_hits or text_hits:
+        return "table" if table_hits > text_hits else "text"
+
+    # 2) glossary에 없으면 키워드 기준
     q = query.lower()
     table_keywords = [
         "table", "표", "points", "score", "alloc", "타이어", "할당", "schedule"
@@ -66,24 +167,106 @@ def route_query(query: str) -> str:
 # ---------------------------------------
 # 3. 모든 VectorStore 검색 (Cross-store search)
 # ---------------------------------------
-def retrieve_across_all(query: str, k: int = 6, target_type: str = None):
+def stores_for_query(query: str, target_type: str = None):
     """
-    모든 VectorStore에 대해 검색 결과를 합쳐서 반환.
+    검색 대상 store [(name, item), ...]
 
-    target_type = "table" 또는 "text" 또는 None
+    - shard routing: 현재 시즌 shard만 (질문에 연도가 있으면 그 시즌)
+    - target_type = "table" 또는 "text" 또는 None
     """
-    results = []
-
-    for name, item in VECTORSTORES.items():
-        # route 기반 필터링 수행
+    refresh_if_changed()
+    stores = VECTORSTORES
+    targets = []
+    for name in select_stores(query, list(stores)):
         if target_type == "table" and "tables" not in name:
             continue
         if target_type == "text" and "text" not in name:
             continue
+        targets.append((name, stores[name]))
+    return targets
+
+
+def _search_store(name, item, vector, k, articles=None):
+    with span("retrieve_store", store=name):
+        docs = item["vs"].similarity_search_by_vector(vector, k=k, filter=article_filter(articles))
+    incr("retrieved_docs", len(docs), store=name)
+    return docs
+
 
-        retriever = item["vs"].as_retriever(search_kwargs={"k": k})
-        docs = retriever.invoke(query)
-        results.extend(docs)
+RETRIEVE_FLIGHT = SingleFlight("retrieve", timeout=float(os.getenv("RAG_RETRIEVE_SINGLEFLIGHT_TIMEOUT", "30")))
+
+
+def retrieve_across_all(query: str, k: int = 6, target_type: str = None):
+    """
+    라우팅된 VectorStore 검색 결과를 합쳐서 반환.
+
+    - query embedding은 1번만 계산해서 모든 store에 재사용
+    - centroid router가 상위 store / article cluster만 선택 (확신 낮으면 전체)
+    - 같은 검색이 동시에 들어오면 embedding / 검색 1번만 실행 (single-flight)
+
+    target_type = "table" 또는 "text" 또는 None
+    """
+    refresh_if_changed()
+    key = (normalize_query(query), k, target_type, STORE_VERSION)
+    return RETRIEVE_FLIGHT.do(key, _retrieve_across_all, query, k, target_type)
+
+
+def _retrieve_across_all(query: str, k: int, target_type: str = None):
+    results = []
+
+    with span("retrieve"):
+        with span("embed_query"):
+            vector = embeddings.embed_query(query)
+
+        targets = route(vector, stores_for_query(query, target_type))
+        incr("router_fanout", len(targets))
+
+        for name, item, articles in targets:
+            results.extend(_search_store(name, item, vector, k, articles))
+
+    return results
+
+
+def retrieve_many(queries: List[str], k: int = 6, target_type: str = None):
+    """
+    여러 질문을 한 번에 검색 (batch 평가용).
+
+    - 질문 embedding은 embed_documents 1회 호출로 일괄 계산
+    - 같은 store + 같은 article 필터로 라우팅된 질문끼리 Chroma collection.query 1회
+
+    반환: queries와 같은 순서의 Document 리스트들
+    """
+    results = [[] for _ in queries]
+    if not queries:
+        return results
+
+    with span("embed_batch"):
+        vectors = embeddings.embed_documents(queries)
+
+    # (store, article 필터)별로 라우팅된 질문 index
+    routed = {}
+    stores = {}
+    for i, (q, vector) in enumerate(zip(queries, vectors)):
+        for name, item, articles in route(vector, stores_for_query(q, target_type)):
+            key = (name, tuple(articles) if articles else None)
+            routed.setdefault(key, []).append(i)
+            stores[name] = item
+
+    with span("retrieve_batch"):
+        for (name, articles), idx in routed.items():
+            with span("retrieve_store_batch", store=name):
+                res = stores[name]["vs"]._collection.query(
+                    query_embeddings=[vectors[i] for i in idx],
+                    n_results=k,
+                    where=article_filter(articles),
+                    include=["documents", "metadatas"],
+                )
+
+            for i, texts, metas in zip(idx, res["documents"], res["metadatas"]):
+                results[i].extend(
+                    Document(page_content=t, metadata=m or {})
+                    for t, m in zip(texts, metas)
+                )
 
     return results
 
@@ -109,27 +292,30 @@ class ClosureRetriever(BaseRetriever):
 # 5. get_retriever — 통합 retriever 생성
 # ---------------------------------------
 def get_retriever(k=12, query=""):
-    route = route_query(query)
-
-    # 1) route 기반으로 해당 스토어만 선택
-    target = [
-        item["vs"]
-        for name, item in VECTORSTORES.items()
-        if (route == "table" and "tables" in name)
-        or (route == "text" and "text" in name)
-    ]
-
-    # fallback – 아무 것도 없으면 전체 사용
-    if not target:
-        target = [item["vs"] for _, item in VECTORSTORES.items()]
+    """
+    질문마다 centroid router로 store / article cluster 선택.
+    profile이 하나도 없는 예전 빌드는 route_query (glossary / 키워드) 기준.
+    """
 
-    # 2) 여러 vectorstore → 하나의 docs_fn 으로 감싸기
     def docs_fn(q):
+        candidates = stores_for_query(q)
+
+        with span("embed_query"):
+            vector = embeddings.embed_query(q)
+
+        if any(item.get("profile") for _, item in candidates):
+            mode = "centroid"
+            targets = route(vector, candidates)
+        else:
+            mode = route_query(q)
+            # fallback – 해당 종류 store가 없으면 라우팅된 전체 사용
+            typed = stores_for_query(q, mode) or candidates
+            targets = [(name, item, None) for name, item in typed]
+
         docs = []
-        for vs in target:
-            retr = vs.as_retriever(search_kwargs={"k": k})
-            docs.extend(retr.invoke(q))
+        with span("get_retriever", route=mode):
+            for name, item, articles in targets:
+                docs.extend(_search_store(name, item, vector, k, articles))
         return docs
 
     return ClosureRetriever(docs_fn)
-
@@ -0,0 +1,208 @@
+"""
+Headless RAG API 서버 (ASGI).
+
+    uvicorn server:app --host 0.0.0.0 --port 8000 --workers 4
+
+- worker 프로세스마다 output/chroma 를 read-only로 로드해서 같은 index를 공유
+- /rebuild 는 RAG_API_ALLOW_REBUILD=1 인 인스턴스 1개에서만 허용 (단일 writer)
+- Streamlit은 RAG_API_URL=http://host:8000 설정 시 thin client로 동작
+  (질문 / 빌드 등록 / 작업 목록 / 지표 모두 이 서버 경유, Streamlit에서는 빌드 worker 없음)
+"""
+import os
+import asyncio
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+import retriever
+import singleflight
+import tracing
+from api_client import doc_to_dict, result_to_dict
+from clients import pool_stats
+from processors.shards import load_manifest
+from rag_answer import RetrievalUnavailable, answer_question
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+MAX_CONCURRENCY = int(os.getenv("RAG_API_MAX_CONCURRENCY", "8"))
+MAX_QUEUE = int(os.getenv("RAG_API_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.getenv("RAG_API_QUEUE_TIMEOUT", "30"))
+ALLOW_REBUILD = os.getenv("RAG_API_ALLOW_REBUILD", "0") == "1"
+
+app = FastAPI(title="F1 Regulation RAG API")
+
+
+# ---------------------------------------
+# 1. Admission control (동시 실행 수 + 대기열 상한)
+# ---------------------------------------
+class Admission:
+    """
+    - 동시에 처리하는 요청은 max_concurrency 개
+    - 그 뒤로 max_queue 개까지만 대기, 넘치면 즉시 503
+    - 대기 시간이 queue_timeout을 넘으면 503
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self._sem = None
+        self._max_concurrency = max_concurrency
+
+    def _semaphore(self):
+        # event loop 안에서 생성
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self._max_concurrency)
+        return self._sem
+
+    async def run(self, fn, *args, **kwargs):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Queue full", headers={"Retry-After": "1"})
+
+        sem = self._semaphore()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Queue timeout", headers={"Retry-After": "1"})
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            # 동기 RAG 파이프라인은 thread에서 실행 → event loop는 계속 요청 수락
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        finally:
+            self.running -= 1
+            sem.release()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrency": self._max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+admission = Admission(MAX_CONCURRENCY, MAX_QUEUE, QUEUE_TIMEOUT)
+
+
+# ---------------------------------------
+# 2. Request 모델
+# ---------------------------------------
+class AskRequest(BaseModel):
+    question: str
+    k: int = 8
+
+
+class RetrieveRequest(BaseModel):
+    query: str
+    k: int = 6
+    target_type: Optional[str] = None
+
+
+class RebuildRequest(BaseModel):
+    pdf_path: Optional[str] = None  # 없으면 data 폴더 전체
+
+
+# ---------------------------------------
+# 3. Endpoints
+# ---------------------------------------
+@app.post("/ask")
+async def ask(req: AskRequest):
+    if not req.question.strip():
+        raise HTTPException(status_code=400, detail="Empty question")
+
+    with tracing.span("api_ask"):
+        try:
+            result = await admission.run(answer_question, req.question, req.k)
+        except RetrievalUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return result_to_dict(result)
+
+
+@app.post("/retrieve")
+async def retrieve(req: RetrieveRequest):
+    with tracing.span("api_retrieve"):
+        docs = await admission.run(
+            retriever.retrieve_across_all, req.query, k=req.k, target_type=req.target_type
+        )
+    return {"docs": [doc_to_dict(d) for d in docs]}
+
+
+def _reload_index(job):
+    retriever.load_vectorstores()
+
+
+@app.post("/rebuild")
+async def rebuild(req: RebuildRequest):
+    """
+    빌드는 background job queue로 등록 (Streamlit과 같은 queue 공유 → 중복 / 동시 빌드 방지).
+    새 build는 staging → 검증 → promote 되므로 빌드 중에도 기존 index로 계속 응답.
+    """
+    if not ALLOW_REBUILD:
+        raise HTTPException(status_code=403, detail="Rebuild disabled on this instance")
+
+    from processors import jobs
+
+    jobs.add_listener(_reload_index)
+    jobs.start_worker()
+    job_id = await asyncio.to_thread(jobs.submit_job, req.pdf_path)
+    return {"status": "queued", "job_id": job_id}
+
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 20):
+    from processors import jobs
+
+    return {"jobs": await asyncio.to_thread(jobs.list_jobs, limit)}
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    if not ALLOW_REBUILD:
+        raise HTTPException(status_code=403, detail="Rebuild disabled on this instance")
+
+    from processors import jobs
+
+    await asyncio.to_thread(jobs.cancel_job, job_id)
+    return {"status": "cancel_requested", "job_id": job_id}
+
+
+@app.get("/index/stats")
+async def index_stats():
+    from processors.index_tools import all_stats
+
+    return {"stores": await asyncio.to_thread(all_stats)}
+
+
+@app.get("/healthz")
+async def healthz():
+    return {
+        "stores": sorted(retriever.VECTORSTORES),
+        "current_shards": load_manifest().get("current", {}),
+        "admission": admission.stats(),
+        "http_pool": pool_stats(),
+        "singleflight": singleflight.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(format: str = "prometheus"):
+    # format=json → tracing.snapshot() (Streamlit thin client Diagnostics 패널용)
+    if format == "json":
+        return PlainTextResponse(tracing.export_json(), media_type="application/json")
+    return tracing.export_prometheus()
@@ -0,0 +1,103 @@
+import os
+import re
+import copy
+import threading
+import unicodedata
+
+from tracing import span, incr
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+# 먼저 시작된 계산을 기다리는 최대 시간 (초)
+DEFAULT_TIMEOUT = float(os.getenv("RAG_SINGLEFLIGHT_TIMEOUT", "90"))
+
+_registry = {}
+
+
+class SingleFlightTimeout(TimeoutError):
+    pass
+
+
+def normalize_query(query: str) -> str:
+    """
+    같은 질문으로 볼 key — NFKC / 소문자 / 공백 정리 / 끝 문장부호 제거.
+    """
+    q = unicodedata.normalize("NFKC", query or "").lower()
+    q = re.sub(r"\s+", " ", q).strip()
+    return q.rstrip("?？.!。 ")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+# ---------------------------------------
+# 1. Single-flight (동일 요청 합치기)
+# ---------------------------------------
+class SingleFlight:
+    """
+    같은 key로 동시에 들어온 호출은 먼저 온 1개(leader)만 실제로 실행하고,
+    나머지(follower)는 그 결과 / 예외를 그대로 공유.
+
+    - 결과 cache가 아님: leader가 끝나면 key는 바로 비워짐 (다음 호출은 새로 실행)
+    - follower는 timeout 초까지만 기다리고 SingleFlightTimeout
+      (leader 계산은 계속 진행)
+    - follower에게는 결과의 shallow copy 전달 → 호출하는 쪽에서 dict를 고쳐도 서로 영향 없음
+    """
+
+    def __init__(self, name: str, timeout: float = DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        _registry[name] = self
+
+    def do(self, key, fn, *args, timeout: float = None, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                call.followers += 1
+
+        if leader:
+            incr("singleflight_leader", flight=self.name)
+            try:
+                call.result = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            return call.result
+
+        incr("singleflight_shared", flight=self.name)
+        wait_for = self.timeout if timeout is None else timeout
+        with span("singleflight_wait", flight=self.name):
+            finished = call.done.wait(wait_for)
+
+        if not finished:
+            raise SingleFlightTimeout(f"{self.name}: waited {wait_for}s for in-flight request")
+        if call.error is not None:
+            raise call.error
+        return copy.copy(call.result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(c.followers for c in self._calls.values()),
+            }
+
+
+def stats():
+    return {name: flight.stats() for name, flight in _registry.items()}
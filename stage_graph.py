@@ -0,0 +1,136 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tracing import incr
+
+# ---------------------------------------
+# 0. 공유 Thread Pool (전역 1개만 사용)
+# ---------------------------------------
+# 요청 1개당 동시에 최대 3개 stage (docs_ko ∥ query_en → docs_en)
+# → server.py admission 동시 실행 수 × 3 (pool 대기 시간이 stage timeout을 잡아먹지 않도록)
+STAGES_PER_REQUEST = 3
+STAGE_WORKERS = int(os.getenv(
+    "RAG_STAGE_WORKERS",
+    str(STAGES_PER_REQUEST * int(os.getenv("RAG_API_MAX_CONCURRENCY", "8"))),
+))
+EXECUTOR = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="rag-stage")
+
+# 아직 시작 안 한 (pool 대기 중) stage가 있을 때 시작 여부 확인 주기 (초)
+START_POLL_INTERVAL = 0.05
+
+
+class StageTimeout(Exception):
+    pass
+
+
+class StageResults(dict):
+    """
+    stage 이름 → 결과. failed = fallback으로 대체된 stage {이름: 오류 문자열}.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failed = {}
+
+
+# ---------------------------------------
+# 1. Stage 실패 처리 (fallback or 예외 전파)
+# ---------------------------------------
+def _resolve_failure(name, stage, error, results):
+    if "fallback" in stage:
+        print(f"⚠ Stage '{name}' failed ({error!r}) → fallback 사용")
+        incr("stage_fallback", stage=name)
+        results.failed[name] = repr(error)
+        return stage["fallback"]
+    raise error
+
+
+def _run_stage(started, name, fn, kwargs):
+    # 실제로 thread에서 시작된 시각 → deadline 기준
+    started[name] = time.monotonic()
+    return fn(**kwargs)
+
+
+# ---------------------------------------
+# 2. 의존성 기반 Stage 실행
+# ---------------------------------------
+def run_stage_graph(stages, executor=None):
+    """
+    의존성 그래프 형태의 stage들을 thread pool에서 동시에 실행.
+
+    stages = {
+        "query_en": {"fn": translate, "timeout": 20, "fallback": query},
+        "docs_en": {"fn": search, "deps": ["query_en"], "timeout": 15, "fallback": []},
+    }
+
+    - fn은 deps stage들의 결과를 같은 이름의 keyword 인자로 받음
+    - deps가 모두 끝난 stage는 즉시 제출 → 독립된 branch는 겹쳐서 실행
+      (전체 latency = branch 합계가 아니라 가장 긴 branch)
+    - timeout(초)은 stage가 thread에서 실제로 시작된 시점부터 계산 (pool 대기 시간 제외)
+    - 예외 / timeout 발생 시 "fallback"이 있으면 그 값으로 대체, 없으면 예외 전파
+      (timeout 된 thread는 강제 종료할 수 없으므로 결과만 버림)
+    - 반환: StageResults — fallback으로 대체된 stage는 results.failed에 기록
+    """
+    executor = executor or EXECUTOR
+
+    results = StageResults()
+    pending = dict(stages)
+    running = {}  # future → stage name
+    started = {}  # stage name → 시작 시각 (worker thread에서 기록)
+
+    def deadline_of(name):
+        timeout = stages[name].get("timeout")
+        if not timeout or name not in started:
+            return None
+        return started[name] + timeout
+
+    def submit_ready():
+        for name, stage in list(pending.items()):
+            deps = stage.get("deps", [])
+            if not all(d in results for d in deps):
+                continue
+
+            kwargs = {d: results[d] for d in deps}
+            # contextvars 복사 → tracing span이 요청 trace에 기록됨
+            ctx = contextvars.copy_context()
+            future = executor.submit(ctx.run, _run_stage, started, name, stage["fn"], kwargs)
+            running[future] = name
+            del pending[name]
+
+    submit_ready()
+
+    while running:
+        deadlines = [d for d in map(deadline_of, running.values()) if d is not None]
+        wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+        # pool 대기 중인 timeout stage가 있으면 시작 시점을 놓치지 않도록 짧게 깨어남
+        if any(stages[n].get("timeout") and n not in started for n in running.values()):
+            wait_for = START_POLL_INTERVAL if wait_for is None else min(wait_for, START_POLL_INTERVAL)
+
+        done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name = running.pop(future)
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                results[name] = _resolve_failure(name, stages[name], e, results)
+
+        # 🔥 deadline 지난 stage는 결과를 기다리지 않고 fallback 처리
+        now = time.monotonic()
+        for future, name in list(running.items()):
+            deadline = deadline_of(name)
+            if deadline is not None and now >= deadline:
+                running.pop(future)
+                future.cancel()
+                error = StageTimeout(f"{name} exceeded {stages[name]['timeout']}s")
+                results[name] = _resolve_failure(name, stages[name], error, results)
+
+        submit_ready()
+
+    if pending:
+        raise ValueError(f"Unresolvable stage dependencies: {sorted(pending)}")
+
+    return results
@@ -1,26 +1,99 @@
 import os
 import json
+import uuid
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from retriever import get_retriever
-from rag_answer import ask_question
-from processors.build_vectorstores import build_all_vectorstores_from_data
+# RAG_API_URL 이 설정되면 server.py 에 질의 (thin client 모드)
+API_MODE = bool(os.getenv("RAG_API_URL"))
+
+if API_MODE:
+    # 빌드 / 작업 목록 / 지표도 server.py 경유 (ingestion stack은 import하지 않음)
+    import api_client
+    import api_client as jobs
+    from api_client import answer_question
+else:
+    from rag_answer import answer_question
+    from processors import jobs
+from chat_history import ChatHistory
+import tracing
 from streamlit_lottie import st_lottie
 
 
 # ----------------------------------------------------------
-# Lottie 파일 로드
+# Process-wide cache (rerun마다 다시 계산하지 않음)
 # ----------------------------------------------------------
+@st.cache_resource(show_spinner=False)
 def load_lottie_from_file(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+@st.cache_data(show_spinner=False)
+def list_pdf_files(data_dir: str, mtime: float):
+    # mtime이 cache key → PDF 추가/삭제 시 자동으로 다시 조회
+    return sorted(f for f in os.listdir(data_dir) if f.lower().endswith(".pdf"))
+
+
+def current_pdf_files(data_dir: str = "data"):
+    return list_pdf_files(data_dir, os.path.getmtime(data_dir))
+
+
+@st.cache_resource(show_spinner=False)
+def vectorstore_exists():
+    if API_MODE:
+        try:
+            return bool(api_client.healthz()["stores"])
+        except Exception as e:
+            print(f"⚠ healthz failed: {e}")
+            return False
+    return os.path.exists("output/chroma")
+
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def parse_table_evidence(page_content: str):
+    try:
+        return pd.DataFrame(json.loads(page_content))
+    except Exception:
+        return None
+
+
+def on_index_rebuilt():
+    """
+    벡터스토어 재생성 후 index 관련 cache 무효화.
+    """
+    vectorstore_exists.clear()
+    if not API_MODE:
+        import retriever
+        retriever.load_vectorstores()
+
+
+@st.cache_resource(show_spinner=False)
+def start_ingestion_worker():
+    # 프로세스당 1번: background 빌드 worker 시작 + 완료 시 index reload
+    jobs.add_listener(lambda job: on_index_rebuilt())
+    jobs.start_worker()
+    return True
+
+
+def submit_build(pdf_path: str = None):
+    """
+    빌드 job 등록 → job id (API 모드에서 서버가 거부하면 None).
+    """
+    try:
+        return jobs.submit_job(pdf_path)
+    except Exception as e:
+        st.error(f"빌드 작업 등록 실패: {e}")
+        return None
+
+
 LOADING_ANIMATION = load_lottie_from_file("assets/loading.json")
+if not API_MODE:
+    # API 모드에서는 server.py (RAG_API_ALLOW_REBUILD=1)가 단일 writer
+    start_ingestion_worker()
 
 
 # ----------------------------------------------------------
@@ -141,35 +214,22 @@ st.markdown("""
 # 초기 Vectorstore 체크
 # ----------------------------------------------------------
 def initialize_vectorstores():
-    data_dir = "data"
-    pdf_files = [
-        f for f in os.listdir(data_dir)
-        if f.lower().endswith(".pdf")
-    ]
+    pdf_files = current_pdf_files()
 
     if not pdf_files:
         st.warning("⚠ data 폴더에 PDF가 없습니다. Sidebar에서 업로드해주세요.")
         return
 
     # 이미 chroma 폴더가 있으면 그대로 사용
-    if os.path.exists("output/chroma"):
+    if vectorstore_exists():
         st.info("✔ 기존 vectorstore가 감지되었습니다. 바로 질문 가능합니다.")
         return
 
-    st.info("📚 처음 실행: data 폴더의 문서로 벡터스토어 생성 중...")
-
-    # Lottie 로더 표시
-    loader_placeholder = st.empty()
-    with loader_placeholder:
-        st_lottie(LOADING_ANIMATION, height=140, key="init-lottie")
+    # background job으로 생성 (session당 1번만 등록, 같은 job은 queue에서 중복 제거)
+    if "init_job" not in st.session_state:
+        st.session_state["init_job"] = submit_build()
 
-    # 실제 벡터스토어 생성
-    build_all_vectorstores_from_data()
-
-    # 로딩 애니메이션 제거
-    loader_placeholder.empty()
-
-    st.success("🎉 벡터스토어 생성 완료!")
+    st.info("📚 처음 실행: data 폴더의 문서로 벡터스토어 생성 중... (진행률은 Sidebar 참고)")
 
 
 initialize_vectorstores()
@@ -178,12 +238,19 @@ initialize_vectorstores()
 # ----------------------------------------------------------
 # 세션 상태 초기화
 # ----------------------------------------------------------
-if "messages" not in st.session_state:
-    st.session_state["messages"] = []  # Chat history
+if "history" not in st.session_state:
+    # Chat history — 최근 대화만 메모리, 나머지는 output/chat_history.sqlite3
+    st.session_state["history"] = ChatHistory(uuid.uuid4().hex)
+
+if "history_page" not in st.session_state:
+    st.session_state["history_page"] = 0  # 0 = 최신 page
 
 if "last_docs" not in st.session_state:
     st.session_state["last_docs"] = []  # Evidence 패널
 
+if "last_trace" not in st.session_state:
+    st.session_state["last_trace"] = []  # Diagnostics 패널 (마지막 질문 stage별 시간)
+
 
 # ----------------------------------------------------------
 # SIDEBAR - 문서 관리
@@ -191,8 +258,7 @@ if "last_docs" not in st.session_state:
 with st.sidebar:
     st.header("📄 문서 관리 & 벡터스토어 생성")
 
-    data_dir = "data"
-    pdf_files = [f for f in os.listdir(data_dir) if f.lower().endswith(".pdf")]
+    pdf_files = current_pdf_files()
 
     st.subheader("📚 현재 등록된 PDF 문서")
     if len(pdf_files) == 0:
@@ -205,14 +271,9 @@ with st.sidebar:
     st.subheader("🔄 전체 문서 재처리")
 
     if st.button("📦 data 폴더 문서로 벡터스토어 재생성", use_container_width=True):
-        loader_placeholder = st.empty()
-        with loader_placeholder:
-            st_lottie(LOADING_ANIMATION, height=140, key="rebuild-all")
-
-        build_all_vectorstores_from_data()
-        loader_placeholder.empty()
-
-        st.success("🎉 전체 벡터스토어 재생성 완료!")
+        job_id = submit_build()
+        if job_id is not None:
+            st.success(f"🕒 재생성 작업 #{job_id} 등록 — 빌드 중에도 질문할 수 있습니다.")
 
     st.markdown("---")
     st.subheader("📤 PDF 업로드")
@@ -220,22 +281,91 @@ with st.sidebar:
     uploaded_pdf = st.file_uploader("규정 PDF 업로드", type=["pdf"])
     if uploaded_pdf is not None:
         save_path = os.path.join("data", uploaded_pdf.name)
-        with open(save_path, "wb") as f:
-            f.write(uploaded_pdf.getbuffer())
+
+        # 같은 파일은 rerun마다 다시 쓰지 않음
+        upload_sig = (uploaded_pdf.name, uploaded_pdf.size)
+        if st.session_state.get("saved_upload") != upload_sig:
+            with open(save_path, "wb") as f:
+                f.write(uploaded_pdf.getbuffer())
+            st.session_state["saved_upload"] = upload_sig
 
         st.success(f"저장됨 → `{save_path}`")
 
         if st.button("📄 업로드한 PDF만 벡터스토어 생성", use_container_width=True):
-            from processors.build_vectorstores import build_vectorstore_for_single_file
-
-            loader_placeholder = st.empty()
-            with loader_placeholder:
-                st_lottie(LOADING_ANIMATION, height=140, key="rebuild-single")
+            job_id = submit_build(save_path)
+            if job_id is not None:
+                st.success(f"🕒 빌드 작업 #{job_id} 등록 완료!")
 
-            build_vectorstore_for_single_file(save_path)
-            loader_placeholder.empty()
+    st.markdown("---")
+    st.subheader("🛠 빌드 작업")
+
+    def render_ingestion_jobs():
+        job_list = jobs.list_jobs(limit=5)
+        if not job_list:
+            st.caption("등록된 빌드 작업이 없습니다.")
+
+        for job in job_list:
+            target = os.path.basename(job["pdf_path"]) if job["pdf_path"] else "data 전체"
+            text = f"#{job['id']} {target} · {job['status']}"
+            if job["status"] == "running":
+                text += f" · {job['stage'] or ''}"
+                if job["eta_seconds"] is not None:
+                    text += f" · ETA {int(job['eta_seconds'])}s"
+            st.progress(min(1.0, job["progress"] or 0.0), text=text)
+
+            if job["status"] in ("queued", "running"):
+                if st.button("취소", key=f"cancel-job-{job['id']}"):
+                    jobs.cancel_job(job["id"])
+            elif job["status"] == "failed":
+                st.caption(f"❌ {job['message']}")
+
+        # 진행 중이던 작업이 모두 끝나면 전체 화면 갱신 (새 index 반영)
+        active = any(j["status"] in ("queued", "running") for j in job_list)
+        if st.session_state.get("jobs_active") and not active:
+            st.session_state["jobs_active"] = False
+            if API_MODE:
+                # 로컬 worker listener가 없으므로 여기서 cache 무효화
+                on_index_rebuilt()
+            st.rerun()
+        st.session_state["jobs_active"] = active
+
+    # 진행 중인 작업이 있을 때만 2초마다 이 영역만 polling
+    st.fragment(run_every=2 if jobs.has_active_jobs() else None)(render_ingestion_jobs)()
 
-            st.success("🎉 업로드한 문서 기반 벡터스토어 생성 완료!")
+    st.markdown("---")
+    with st.expander("⏱ Diagnostics (stage latency)"):
+        if st.session_state["last_trace"]:
+            st.caption("마지막 질문")
+            st.dataframe(pd.DataFrame(st.session_state["last_trace"]), use_container_width=True)
+
+        # API 모드 → 실제로 검색 / LLM 호출을 하는 server.py의 지표
+        if API_MODE:
+            health = api_client.healthz()
+            metrics = api_client.metrics()
+            pool = health["http_pool"]
+            prometheus_text = api_client.metrics("prometheus")
+        else:
+            from clients import pool_stats
+            metrics = tracing.snapshot()
+            pool = pool_stats()
+            prometheus_text = tracing.export_prometheus()
+
+        if metrics["latencies"]:
+            st.caption("누적 p50 / p95 / p99 (ms)")
+            rows = [
+                {**{k: v for k, v in r.items() if k != "labels"},
+                 "labels": ", ".join(f"{k}={v}" for k, v in r["labels"].items())}
+                for r in metrics["latencies"]
+            ]
+            st.dataframe(pd.DataFrame(rows), use_container_width=True)
+
+        st.caption("HTTP connection pool")
+        st.json(pool)
+
+        st.download_button("Prometheus export", prometheus_text, file_name="rag_metrics.prom")
+        st.download_button(
+            "JSON export", json.dumps(metrics, ensure_ascii=False, indent=2), file_name="rag_metrics.json"
+        )
 
 
 # ----------------------------------------------------------
@@ -270,40 +400,82 @@ with right_panel:
     # ---------------------------
     if send and user_query.strip():
         # 1) 사용자 메시지 추가
-        st.session_state["messages"].append(
-            {"role": "user", "content": user_query}
-        )
+        history = st.session_state["history"]
+        history.add_user(user_query)
 
-        # 2) 문서 검색 (Evidence Panel용)
-        retriever = get_retriever(k=5, query=user_query)
-        docs = retriever.invoke(user_query)[:4]
-        st.session_state["last_docs"] = docs
-
-        # 3) Lottie 로딩 + RAG 답변 생성
+        # 2) Lottie 로딩 + RAG 답변 생성 (검색 1회)
         with loading_area:
             st_lottie(LOADING_ANIMATION, height=120, key="qa-loading")
 
-        answer = ask_question(user_query, 12)
+        try:
+            result = answer_question(user_query, 12)
+        except Exception as e:
+            # 검색 실패 (RetrievalUnavailable / API 503) → 빈 답변 대신 오류 표시
+            loading_area.empty()
+            st.error(f"검색에 실패했습니다. 잠시 후 다시 시도해주세요. ({e})")
+            st.stop()
 
         # 로딩 제거
         loading_area.empty()
 
-        # 4) Assistant 메시지 저장
-        st.session_state["messages"].append(
-            {"role": "assistant", "content": answer}
-        )
+        # 3) Evidence Panel = 답변 Context에 실제로 사용된 문서
+        st.session_state["last_docs"] = result["docs"]
+        st.session_state["last_trace"] = result["trace"]
+
+        # 4) Assistant 메시지 저장 (HTML이 아닌 답변 / 인용 record)
+        history.add_answer(result)
+        st.session_state["history_page"] = 0
 
         # 입력창 초기화 후 rerun → top_input 값 리셋
         st.session_state.pop("top_input", None)
         st.rerun()
 
     # ---------------------------
-    # 메시지 출력 (최신순)
+    # 메시지 출력 (최신순, page 단위)
     # ---------------------------
-    for msg in reversed(st.session_state["messages"]):
-        with st.chat_message(msg["role"]):
-            # rag_answer는 마크다운 기반 출력이므로 unsafe_allow_html는 상황에 따라 조정 가능
-            st.markdown(msg["content"], unsafe_allow_html=True)
+    HISTORY_PAGE_SIZE = 10
+
+    def render_record(rec):
+        with st.chat_message(rec["role"]):
+            if rec["role"] == "user":
+                st.markdown(rec["content"])
+                return
+
+            st.markdown("### 📘 답변")
+            st.markdown(rec["content"])
+            if not rec.get("grounded", True):
+                st.caption("규정 문서에서 근거를 찾지 못해 일반 F1 지식으로 답변했습니다.")
+            if rec.get("degraded"):
+                st.caption(f"⚠ 일부 단계가 시간 초과 / 오류로 생략되었습니다: {', '.join(rec['degraded'])}")
+
+            if rec.get("citations"):
+                with st.expander(f"📎 규정 인용 ({len(rec['citations'])})"):
+                    for c in rec["citations"]:
+                        # 규정 원문 / 표 JSON의 * # _ | 가 markdown으로 해석되지 않도록 그대로 출력
+                        st.text(c["text"])
+                        st.caption(f"📎 {c['citation']}")
+
+    @st.fragment
+    def render_history():
+        history = st.session_state["history"]
+        pages = history.page_count(HISTORY_PAGE_SIZE)
+        page_idx = min(st.session_state["history_page"], pages - 1)
+
+        for rec in history.page(page_idx, HISTORY_PAGE_SIZE):
+            render_record(rec)
+
+        # page 이동은 이 영역만 rerun
+        if pages > 1:
+            prev_col, info_col, next_col = st.columns([1, 2, 1])
+            if prev_col.button("◀ 최근", disabled=page_idx == 0, use_container_width=True):
+                st.session_state["history_page"] = page_idx - 1
+                st.rerun(scope="fragment")
+            info_col.caption(f"{page_idx + 1} / {pages} page · 전체 {len(history)}개 메시지")
+            if next_col.button("이전 ▶", disabled=page_idx >= pages - 1, use_container_width=True):
+                st.session_state["history_page"] = page_idx + 1
+                st.rerun(scope="fragment")
+
+    render_history()
 
 
 # ==========================================================
@@ -313,7 +485,10 @@ with left_panel:
     st.header("📘 답변에 사용된 규정 원문")
 
     if len(st.session_state["last_docs"]) == 0:
-        st.info("아직 질문이 없습니다. 질문을 입력하면 관련된 규정 원문이 여기에 표시됩니다.")
+        if len(st.session_state["history"]):
+            st.info("마지막 답변은 규정 원문 없이 생성되었습니다.")
+        else:
+            st.info("아직 질문이 없습니다. 질문을 입력하면 관련된 규정 원문이 여기에 표시됩니다.")
     else:
         for i, d in enumerate(st.session_state["last_docs"]):
             st.markdown(
@@ -343,10 +518,10 @@ with left_panel:
                 )
                 st.markdown(meta_html, unsafe_allow_html=True)
 
-                try:
-                    df = pd.DataFrame(json.loads(d.page_content))
+                df = parse_table_evidence(d.page_content)
+                if df is not None:
                     st.table(df)
-                except Exception:
+                else:
                     st.text(d.page_content)
 
             st.markdown("</div>", unsafe_allow_html=True)
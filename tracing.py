@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# ---------------------------------------
+# 0. 설정
+# ---------------------------------------
+# percentile 계산용 최근 sample 개수 (stage / label 조합별)
+WINDOW_SIZE = int(os.getenv("RAG_TRACE_WINDOW", "2048"))
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_latencies = {}   # (name, labels) → {"count", "sum", "samples"}
+_counters = {}    # (name, labels) → int
+
+# 현재 요청의 span 목록 (stage_graph가 thread pool에 context를 복사해서 전달)
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+# ---------------------------------------
+# 1. Span / Counter 기록
+# ---------------------------------------
+def observe(name: str, seconds: float, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _latencies.get(key)
+        if h is None:
+            h = {"count": 0, "sum": 0.0, "samples": deque(maxlen=WINDOW_SIZE)}
+            _latencies[key] = h
+        h["count"] += 1
+        h["sum"] += seconds
+        h["samples"].append(seconds)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append({"span": name, **labels, "ms": round(seconds * 1000, 1)})
+
+
+@contextmanager
+def span(name: str, **labels):
+    """
+    with span("retrieve_store", store="sporting_text"):
+        ...
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def incr(name: str, value: int = 1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_tokens(stage: str, usage):
+    """
+    LLM 응답의 usage_metadata → token counter.
+    """
+    if not usage:
+        return
+    incr("llm_tokens", usage.get("input_tokens", 0), stage=stage, kind="input")
+    incr("llm_tokens", usage.get("output_tokens", 0), stage=stage, kind="output")
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.append({
+            "span": "tokens",
+            "stage": stage,
+            "input": usage.get("input_tokens", 0),
+            "output": usage.get("output_tokens", 0),
+        })
+
+
+@contextmanager
+def trace_request():
+    """
+    요청 1건의 span 목록 수집.
+
+    with trace_request() as spans:
+        ...
+    # spans = [{"span": "translate_en", "ms": 812.3}, ...]
+    """
+    spans = []
+    token = _current_trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _current_trace.reset(token)
+
+
+# ---------------------------------------
+# 2. 집계 (p50 / p95 / p99)
+# ---------------------------------------
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    idx = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+    return sorted_samples[idx]
+
+
+def snapshot():
+    """
+    [{"name", "labels", "count", "avg_ms", "p50_ms", "p95_ms", "p99_ms"}, ...]
+    """
+    with _lock:
+        items = [(k, h["count"], h["sum"], sorted(h["samples"])) for k, h in _latencies.items()]
+        counters = dict(_counters)
+
+    rows = []
+    for (name, labels), count, total, samples in sorted(items):
+        row = {
+            "name": name,
+            "labels": dict(labels),
+            "count": count,
+            "avg_ms": round(total / count * 1000, 1) if count else 0.0,
+        }
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}_ms"] = round(_quantile(samples, q) * 1000, 1)
+        rows.append(row)
+
+    counter_rows = [
+        {"name": name, "labels": dict(labels), "value": value}
+        for (name, labels), value in sorted(counters.items())
+    ]
+    return {"latencies": rows, "counters": counter_rows}
+
+
+def reset():
+    with _lock:
+        _latencies.clear()
+        _counters.clear()
+
+
+# ---------------------------------------
+# 3. Export (JSON / Prometheus text format)
+# ---------------------------------------
+def export_json() -> str:
+    return json.dumps(snapshot(), ensure_ascii=False, indent=2)
+
+
+def _label_str(labels, extra=None):
+    pairs = list(labels.items()) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def export_prometheus() -> str:
+    """
+    Prometheus text exposition format.
+    latency는 summary (quantile / _sum / _count), token 등은 counter.
+    """
+    with _lock:
+        items = [(k, h["count"], h["sum"], sorted(h["samples"])) for k, h in _latencies.items()]
+        counters = dict(_counters)
+
+    lines = []
+
+    metric = "rag_stage_latency_seconds"
+    lines.append(f"# HELP {metric} Latency of RAG pipeline stages.")
+    lines.append(f"# TYPE {metric} summary")
+    for (name, labels), count, total, samples in sorted(items):
+        labels = {"stage": name, **dict(labels)}
+        for q in QUANTILES:
+            lines.append(f"{metric}{_label_str(labels, {'quantile': q})} {_quantile(samples, q):.6f}")
+        lines.append(f"{metric}_sum{_label_str(labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_label_str(labels)} {count}")
+
+    for name in sorted({n for n, _ in counters}):
+        metric = f"rag_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{metric}{_label_str(dict(labels))} {value}")
+
+    return "\n".join(lines) + "\n"